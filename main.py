@@ -1,20 +1,30 @@
 import os
-from fastapi import FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict
+from pydantic import BaseModel, Field
+from typing import List, Dict, Optional, Union
 from transformers import AutoTokenizer, AutoModel
 import torch
 from src.classifier_api import router as classifier_router  # Import the classifier API router
+from src.admission import Admission, admission_controller
+from src.admin_api import router as admin_router
+from src.profiling import SlowRequestTraceMiddleware, record_torch_ops, trace_stage
+from src.deadlines import CancellationToken, resolve_timeout_ms, run_cancellable
+from src.config import EMBEDDING_ALLOWED_MODELS, MODEL_STORE_OFFLINE, TRAFFIC_CAPTURE_ENABLED
+from src.traffic_capture import TrafficCaptureMiddleware
+from src.fast_io import CompressionMiddleware, add_body_schemas, json_body, openapi_body
+from src.model_store import has_model, load_from_store
+from src.compaction import CompactedEmbedding, EmbeddingOutputOptions, compact_embeddings, embedding_size
+from src.autotune import ModelTuning, TuningProfile, apply_profile, autotune, load_profile
 
 # Determine environment: 'development' or 'production'
 ENV = os.getenv("APP_ENV", "development")
 
-# Allowed models for production (add more as needed)
-ALLOWED_MODELS = [
-    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-    # Add more allowed model names here
-]
+# Allowed models for production (add more in src/config.py, where the CLIs read them without importing the app)
+ALLOWED_MODELS = EMBEDDING_ALLOWED_MODELS
 
 # Allowed CORS origins for production
 PROD_CORS_ORIGINS = [
@@ -22,8 +32,33 @@ PROD_CORS_ORIGINS = [
     "https://www.youtube.com"
 ]
 
+# Per-host autotune profile (threads, micro-batch size, padding buckets), applied at startup (see lifespan)
+tuning_profile: Optional[TuningProfile] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Apply the autotune profile before serving. With APP_AUTOTUNE=1 a host without a profile is benchmarked once;
+    see src/autotune.py. Done at startup rather than import so CLIs importing this module do not benchmark.
+    """
+    global tuning_profile
+    tuning_profile = load_profile()
+    if tuning_profile is None and os.getenv("APP_AUTOTUNE") == "1":
+        tuning_profile = autotune(ALLOWED_MODELS)
+    if tuning_profile is not None:
+        apply_profile(tuning_profile)
+    yield
+
+def get_model_tuning(model_name: str) -> Optional[ModelTuning]:
+    """
+    Autotuned settings for the model, or None if it has not been tuned on this host.
+    """
+    if tuning_profile is None:
+        return None
+    return tuning_profile.models.get(model_name)
+
 # Create FastAPI app instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS based on environment
 if ENV == "production":
@@ -43,14 +78,25 @@ else:
         allow_headers=["*"],
     )
 
+# Sample request/response payloads into rotating JSONL files for offline replay (opt-in, see src/replay.py)
+if TRAFFIC_CAPTURE_ENABLED:
+    app.add_middleware(TrafficCaptureMiddleware)
+
+# Compress large responses (zstd/gzip); added after capture so captured bodies stay uncompressed
+app.add_middleware(CompressionMiddleware)
+
+# Record per-stage timings for slow requests (see /admin/slow-traces); outermost, so compression is included
+app.add_middleware(SlowRequestTraceMiddleware)
+
 # Cache for loaded models and tokenizers to avoid reloading
 model_cache: Dict[str, Dict[str, object]] = {}
 
-class EmbeddingRequest(BaseModel):
+class EmbeddingRequest(EmbeddingOutputOptions):
     """
     Request model for embedding endpoint.
     text: The input text for which embeddings are to be generated.
     model_name: The Hugging Face model to use for embeddings.
+    Output options (normalize, dimensions, projection, dtype, encoding_format) are described in EmbeddingOutputOptions.
     """
     text: str
     model_name: str
@@ -58,23 +104,33 @@ class EmbeddingRequest(BaseModel):
 class EmbeddingResponse(BaseModel):
     """
     Response model for embedding endpoint.
-    embeddings: A list of floats representing the embedding vector.
+    embeddings: A list of floats representing the embedding vector
+                (ints for dtype int8, a base64 string for encoding_format base64).
     model: The name of the model used.
     embedding_size: The size (length) of the embedding vector.
+    dtype / encoding_format / normalized: The output options applied.
+    scale: For dtype int8, the factor to multiply the ints by.
     """
-    embeddings: List[float]
+    embeddings: Union[List[int], List[float], str]
     model: str
     embedding_size: int
+    dtype: str = "float32"
+    encoding_format: str = "float"
+    normalized: bool = False
+    scale: Optional[float] = None
 
 # Batch request/response models
-class BatchEmbeddingRequest(BaseModel):
+class BatchEmbeddingRequest(EmbeddingOutputOptions):
     """
     Request model for batch embedding endpoint.
     texts: List of input texts for which embeddings are to be generated.
     model_name: The Hugging Face model to use for embeddings.
+    timeout_ms: Optional deadline in milliseconds (overrides the X-Request-Timeout-Ms header).
+    Output options (normalize, dimensions, projection, dtype, encoding_format) are described in EmbeddingOutputOptions.
     """
     texts: List[str]
     model_name: str
+    timeout_ms: Optional[int] = Field(None, gt=0)
 
 class BatchEmbeddingResponse(BaseModel):
     """
@@ -82,10 +138,19 @@ class BatchEmbeddingResponse(BaseModel):
     embeddings: List of embedding vectors (one per input text).
     model: The name of the model used.
     embedding_size: The size (length) of each embedding vector.
+    partial: True if the deadline passed or the client disconnected first;
+             embeddings then cover only the first len(embeddings) texts.
+    dtype / encoding_format / normalized: The output options applied.
+    scales: For dtype int8, the per-vector factors to multiply the ints by.
     """
-    embeddings: List[List[float]]
+    embeddings: List[Union[List[int], List[float], str]]
     model: str
     embedding_size: int
+    partial: bool = False
+    dtype: str = "float32"
+    encoding_format: str = "float"
+    normalized: bool = False
+    scales: Optional[List[float]] = None
 
 @app.get("/")
 def read_root():
@@ -94,18 +159,42 @@ def read_root():
     Returns a welcome message.
     """
     return {"message": "Welcome to the Gen AI Inference APIs!"}
+def check_model_allowed(model_name: str) -> None:
+    """
+    Raises HTTPException(403) if the model is not allowed in production.
+    """
+    if ENV == "production" and model_name not in ALLOWED_MODELS:
+        raise HTTPException(status_code=403, detail=f"Model '{model_name}' is not allowed in production.")
+
+# Admission key shared by all models that are neither allowed nor loaded
+UNKNOWN_MODEL_KEY = "<unknown>"
+
+def admission_model_key(model_name: str) -> str:
+    """
+    Key of the model's concurrency limiter and micro-batch sizer. Only allowed or already loaded models get their own;
+    any other client-supplied name shares UNKNOWN_MODEL_KEY, so arbitrary names cannot grow the admission state.
+    """
+    if model_name in ALLOWED_MODELS or model_name in model_cache:
+        return model_name
+    return UNKNOWN_MODEL_KEY
+
 def get_tokenizer_and_model(model_name: str):
     """
     Retrieve (and cache) the tokenizer and model for the given model_name.
+    Models in the local model store are loaded from disk; others come from the HuggingFace hub unless MODEL_STORE_OFFLINE is set.
     Raises HTTPException if loading fails or model is not allowed in production.
     """
-    if ENV == "production" and model_name not in ALLOWED_MODELS:
-        raise HTTPException(status_code=403, detail=f"Model '{model_name}' is not allowed in production.")
+    check_model_allowed(model_name)
     if model_name in model_cache:
         return model_cache[model_name]["tokenizer"], model_cache[model_name]["model"]
+    if MODEL_STORE_OFFLINE and not has_model(model_name):
+        raise HTTPException(status_code=400, detail=f"Failed to load model '{model_name}': not in the local model store (offline mode).")
     try:
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModel.from_pretrained(model_name)
+        if has_model(model_name):
+            tokenizer, model = load_from_store(model_name)
+        else:
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = AutoModel.from_pretrained(model_name)
         model_cache[model_name] = {"tokenizer": tokenizer, "model": model}
         return tokenizer, model
     except Exception as e:
@@ -116,43 +205,135 @@ def get_text_embedding(text: str, model_name: str) -> List[float]:
     Generate embeddings for the given text using the specified Hugging Face model.
     Returns a list of floats representing the embedding vector.
     """
-    tokenizer, model = get_tokenizer_and_model(model_name)
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
+    with trace_stage("model_load"):
+        tokenizer, model = get_tokenizer_and_model(model_name)
+    with trace_stage("tokenize"):
+        inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
     with torch.no_grad():
-        outputs = model(**inputs)
-        embeddings = outputs.last_hidden_state.mean(dim=1).squeeze().tolist()
+        with trace_stage("forward"), record_torch_ops():
+            outputs = model(**inputs)
+            pooled = outputs.last_hidden_state.mean(dim=1).squeeze()
+        with trace_stage("tolist"):
+            embeddings = pooled.tolist()
     if isinstance(embeddings, float):
         embeddings = [embeddings]
     return embeddings
 
-@app.post("/embeddings", response_model=EmbeddingResponse)
-def get_embeddings(request: EmbeddingRequest):
+def encode_texts(texts: List[str], model_name: str, pad_to_multiple_of: Optional[int] = None) -> torch.Tensor:
+    """
+    Generate pooled embeddings (n, d) for several texts in a single padded forward pass.
+    Mean pooling uses the attention mask so padding does not change the result,
+    i.e. each vector matches get_text_embedding for the same text.
+    pad_to_multiple_of buckets the padded sequence length (set by the autotune profile).
+    """
+    with trace_stage("model_load"):
+        tokenizer, model = get_tokenizer_and_model(model_name)
+    with trace_stage("tokenize"):
+        inputs = tokenizer(texts, return_tensors="pt", truncation=True, padding=True, pad_to_multiple_of=pad_to_multiple_of)
+    with torch.no_grad():
+        with trace_stage("forward"), record_torch_ops():
+            outputs = model(**inputs)
+            mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+            summed = (outputs.last_hidden_state * mask).sum(dim=1)
+            pooled = summed / mask.sum(dim=1).clamp(min=1)
+    return pooled
+
+@app.post("/embeddings", response_model=EmbeddingResponse, openapi_extra=openapi_body(EmbeddingRequest))
+def get_embeddings(request: EmbeddingRequest = Depends(json_body(EmbeddingRequest))):
     """
     Endpoint to return real embeddings for the given text using the user-specified Hugging Face model.
     Includes the embedding size in the response.
+    Output options can normalize, reduce the dimension and lower the precision of the vector (see EmbeddingOutputOptions).
+    The response is encoded with orjson without re-validating it against EmbeddingResponse (see src/fast_io.py).
+    """
+    check_model_allowed(request.model_name)
+    with admission_controller.admit("/embeddings", admission_model_key(request.model_name)):
+        if request.is_default():
+            embedding = CompactedEmbedding(get_text_embedding(request.text, request.model_name), None)
+        else:
+            pooled = encode_texts([request.text], request.model_name)
+            with trace_stage("tolist"):
+                embedding = compact_embeddings(pooled, request, request.model_name)[0]
+    with trace_stage("serialize"):
+        return ORJSONResponse({
+            "embeddings": embedding.data,
+            "model": request.model_name,
+            "embedding_size": embedding_size(embedding.data, request.dtype),
+            "dtype": request.dtype,
+            "encoding_format": request.encoding_format,
+            "normalized": request.normalize,
+            "scale": embedding.scale,
+        })
+
+def embed_in_micro_batches(
+    texts: List[str],
+    model_name: str,
+    token: CancellationToken,
+    options: EmbeddingOutputOptions,
+    admission: Optional[Admission] = None,
+) -> List[CompactedEmbedding]:
     """
-    embedding = get_text_embedding(request.text, request.model_name)
-    return EmbeddingResponse(
-        embeddings=embedding,
-        model=request.model_name,
-        embedding_size=len(embedding)
+    Embed texts in micro-batches sized by the adaptive sizer (capped by the autotune profile)
+    and apply the output options to each micro-batch.
+    Stops before the next micro-batch once `token` is cancelled or expired and returns what was embedded so far.
+    The slowest micro-batch latency is reported to `admission`, so the concurrency limit does not shrink
+    just because a request carries many texts.
+    """
+    tuning = get_model_tuning(model_name)
+    sizer = admission_controller.get_batch_sizer(
+        "/batch-embeddings", admission_model_key(model_name), max_size=tuning.micro_batch_size if tuning else None
     )
+    pad_to_multiple_of = tuning.pad_to_multiple_of if tuning else None
+    embeddings: List[CompactedEmbedding] = []
+    while len(embeddings) < len(texts) and not token.should_stop():
+        chunk = texts[len(embeddings):len(embeddings) + sizer.size]
+        start = time.perf_counter()
+        pooled = encode_texts(chunk, model_name, pad_to_multiple_of=pad_to_multiple_of)
+        with trace_stage("tolist"):
+            embeddings.extend(compact_embeddings(pooled, options, model_name))
+        latency_ms = (time.perf_counter() - start) * 1000
+        sizer.observe(latency_ms)
+        if admission is not None:
+            admission.latency_ms = max(admission.latency_ms or 0.0, latency_ms)
+    return embeddings
 
-@app.post("/batch-embeddings", response_model=BatchEmbeddingResponse)
-def get_batch_embeddings(request: BatchEmbeddingRequest):
+@app.post("/batch-embeddings", response_model=BatchEmbeddingResponse, openapi_extra=openapi_body(BatchEmbeddingRequest))
+async def get_batch_embeddings(
+    http_request: Request,
+    request: BatchEmbeddingRequest = Depends(json_body(BatchEmbeddingRequest)),
+    x_request_timeout_ms: Optional[str] = Header(None),
+):
     """
     Endpoint to return embeddings for a batch of texts using the user-specified Hugging Face model.
     Returns a list of embedding vectors, model name, and embedding size.
+    Texts are embedded in micro-batches whose size shrinks while the latency SLO is being missed.
+    If the deadline (timeout_ms or X-Request-Timeout-Ms) passes or the client disconnects, pending micro-batches
+    are dropped and the embeddings computed so far are returned with partial=True (504 if there are none).
+    The response is encoded with orjson without re-validating it against BatchEmbeddingResponse (see src/fast_io.py).
     """
     if not request.texts:
         raise HTTPException(status_code=400, detail="No texts provided.")
-    embeddings = [get_text_embedding(text, request.model_name) for text in request.texts]
-    embedding_size = len(embeddings[0]) if embeddings else 0
-    return BatchEmbeddingResponse(
-        embeddings=embeddings,
-        model=request.model_name,
-        embedding_size=embedding_size
-    )
+    check_model_allowed(request.model_name)
+    token = CancellationToken(resolve_timeout_ms(request.timeout_ms, x_request_timeout_ms))
+    with admission_controller.admit("/batch-embeddings", admission_model_key(request.model_name)) as admission:
+        embeddings = await run_cancellable(
+            http_request, token, embed_in_micro_batches, request.texts, request.model_name, token, request, admission
+        )
+    if not embeddings:
+        raise HTTPException(status_code=504, detail="Deadline exceeded before any embedding was computed.")
+    with trace_stage("serialize"):
+        return ORJSONResponse({
+            "embeddings": [e.data for e in embeddings],
+            "model": request.model_name,
+            "embedding_size": embedding_size(embeddings[0].data, request.dtype),
+            "partial": len(embeddings) < len(request.texts),
+            "dtype": request.dtype,
+            "encoding_format": request.encoding_format,
+            "normalized": request.normalize,
+            "scales": [e.scale for e in embeddings] if request.dtype == "int8" else None,
+        })
 
 app.include_router(classifier_router)  # Register the /classify-texts endpoint
+app.include_router(admin_router)  # Register the token-protected /admin endpoints
+add_body_schemas(app)  # Request models of the json_body endpoints in the OpenAPI components
 
@@ -0,0 +1,61 @@
+import os
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from .config import PROFILER_MAX_SECONDS
+from .profiling import SamplingProfiler, run_torch_profiler, slow_traces
+
+# Try to import ADMIN_TOKEN from config_secret.py
+try:
+    from config_secret import ADMIN_TOKEN as SECRET_ADMIN_TOKEN
+except ImportError:
+    SECRET_ADMIN_TOKEN = None
+
+def get_admin_token() -> Optional[str]:
+    """
+    Admin token: config_secret.py > env var. The admin endpoints are disabled if neither is set.
+    """
+    return SECRET_ADMIN_TOKEN or os.getenv("ADMIN_TOKEN")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Dependency protecting the admin endpoints with the X-Admin-Token header.
+    """
+    expected = get_admin_token()
+    if not expected:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled. Set ADMIN_TOKEN to enable them.")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.post("/profile", summary="Profile the running server for N seconds.")
+def profile(
+    seconds: float = Query(10, gt=0, le=PROFILER_MAX_SECONDS, description="How long to profile for."),
+    mode: str = Query("sampling", description="'sampling' (Python stacks of all threads) or 'torch' (torch operator timings of the forward passes)."),
+    top: int = Query(30, gt=0, le=500, description="Number of entries to return per section."),
+):
+    """
+    Start a profiler, let it run for `seconds` while the server keeps serving traffic, stop it and return the report.
+    Only one session runs at a time; a concurrent request gets 409.
+    """
+    if mode not in ("sampling", "torch"):
+        raise HTTPException(status_code=400, detail=f"Invalid mode '{mode}'. Allowed: ['sampling', 'torch']")
+    try:
+        if mode == "torch":
+            return run_torch_profiler(seconds, top=top)
+        return SamplingProfiler().run(seconds, top=top)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/slow-traces", summary="List the most recent slow request traces.")
+def get_slow_traces():
+    """
+    Return the per-stage timing breakdown of the last slow requests, oldest first.
+    """
+    return {"traces": slow_traces.list()}
+
+@router.delete("/slow-traces", summary="Clear the slow request trace buffer.")
+def clear_slow_traces():
+    slow_traces.clear()
+    return {"cleared": True}
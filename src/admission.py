@@ -0,0 +1,166 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+from fastapi import HTTPException
+from .config import (
+    ADMISSION_INITIAL_CONCURRENCY,
+    ADMISSION_MIN_CONCURRENCY,
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_BACKOFF_RATIO,
+    ADMISSION_RETRY_AFTER_SECONDS,
+    LATENCY_SLO_MS,
+    EMBEDDING_MAX_MICRO_BATCH_SIZE,
+    EMBEDDING_MIN_MICRO_BATCH_SIZE,
+    EMBEDDING_MICRO_BATCH_SLO_MS,
+)
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit driven by observed latency.
+    A request that finishes within the SLO while the limit is actually in use raises the limit by one;
+    a request that misses the SLO (or fails) multiplies it by the backoff ratio.
+    """
+    def __init__(
+        self,
+        latency_slo_ms: float,
+        initial_limit: int = ADMISSION_INITIAL_CONCURRENCY,
+        min_limit: int = ADMISSION_MIN_CONCURRENCY,
+        max_limit: int = ADMISSION_MAX_CONCURRENCY,
+        backoff_ratio: float = ADMISSION_BACKOFF_RATIO,
+    ):
+        self.latency_slo_ms = latency_slo_ms
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def try_acquire(self) -> bool:
+        """
+        Reserve a slot. Returns False if the current limit is already reached.
+        """
+        with self._lock:
+            if self._in_flight >= int(self._limit):
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, latency_ms: float, success: bool = True) -> None:
+        """
+        Free a slot and adjust the limit from the observed latency.
+        """
+        with self._lock:
+            # Only grow when the limit is the bottleneck, otherwise an idle service would drift to max.
+            saturated = self._in_flight * 2 >= int(self._limit)
+            self._in_flight -= 1
+            if not success or latency_ms > self.latency_slo_ms:
+                self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+            elif saturated:
+                self._limit = min(float(self.max_limit), self._limit + 1)
+
+class MicroBatchSizer:
+    """
+    Chooses the micro-batch size for batched inference.
+    Halves the size when a micro-batch exceeds its SLO and grows it back by one when under it.
+    """
+    def __init__(
+        self,
+        latency_slo_ms: float = EMBEDDING_MICRO_BATCH_SLO_MS,
+        min_size: int = EMBEDDING_MIN_MICRO_BATCH_SIZE,
+        max_size: int = EMBEDDING_MAX_MICRO_BATCH_SIZE,
+    ):
+        self.latency_slo_ms = latency_slo_ms
+        self.min_size = min_size
+        self.max_size = max_size
+        self._size = max_size
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def observe(self, latency_ms: float) -> None:
+        with self._lock:
+            if latency_ms > self.latency_slo_ms:
+                self._size = max(self.min_size, self._size // 2)
+            else:
+                self._size = min(self.max_size, self._size + 1)
+
+class Admission:
+    """
+    Handle yielded by AdmissionController.admit. Endpoints whose request time grows with the input size set
+    `latency_ms` to a size-independent measurement (e.g. the slowest micro-batch), which the limiter then
+    compares with the SLO instead of the wall-clock time of the admitted block.
+    """
+    def __init__(self):
+        self.latency_ms: Optional[float] = None
+
+class AdmissionController:
+    """
+    Keeps one concurrency limiter and one micro-batch sizer per (endpoint, model) pair
+    and sheds requests with 503 once the limiter is full.
+    """
+    def __init__(self, slo_ms: Optional[Dict[str, float]] = None):
+        self.slo_ms = slo_ms if slo_ms is not None else LATENCY_SLO_MS
+        self._limiters: Dict[Tuple[str, str], AdaptiveConcurrencyLimiter] = {}
+        self._sizers: Dict[Tuple[str, str], MicroBatchSizer] = {}
+        self._lock = threading.Lock()
+
+    def get_limiter(self, endpoint: str, model_name: Optional[str]) -> AdaptiveConcurrencyLimiter:
+        key = (endpoint, str(model_name))
+        with self._lock:
+            if key not in self._limiters:
+                self._limiters[key] = AdaptiveConcurrencyLimiter(latency_slo_ms=self.slo_ms[endpoint])
+            return self._limiters[key]
+
+    def get_batch_sizer(self, endpoint: str, model_name: Optional[str], max_size: Optional[int] = None) -> MicroBatchSizer:
+        """
+        max_size overrides the configured maximum micro-batch size (e.g. from the autotune profile) on first use.
+        """
+        key = (endpoint, str(model_name))
+        with self._lock:
+            if key not in self._sizers:
+                self._sizers[key] = MicroBatchSizer(max_size=max_size) if max_size else MicroBatchSizer()
+            return self._sizers[key]
+
+    @contextmanager
+    def admit(self, endpoint: str, model_name: Optional[str]) -> Iterator[Admission]:
+        """
+        Run the enclosed block under the (endpoint, model) concurrency limit.
+        Raises HTTPException(503) without running it if the limit is reached.
+        Client errors (4xx) do not count as latency failures.
+        """
+        limiter = self.get_limiter(endpoint, model_name)
+        if not limiter.try_acquire():
+            raise HTTPException(
+                status_code=503,
+                detail=f"Server overloaded: concurrency limit {limiter.limit} reached for '{endpoint}'. Please retry later.",
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+        start = time.perf_counter()
+        admission = Admission()
+        success = True
+        try:
+            yield admission
+        except HTTPException as e:
+            success = e.status_code < 500
+            raise
+        except Exception:
+            success = False
+            raise
+        finally:
+            latency_ms = admission.latency_ms if admission.latency_ms is not None else (time.perf_counter() - start) * 1000
+            limiter.release(latency_ms, success=success)
+
+# Shared controller used by the API endpoints
+admission_controller = AdmissionController()
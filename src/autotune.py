@@ -0,0 +1,310 @@
+"""
+Startup autotuner for torch threads, micro-batch size and sequence bucketing.
+
+Usage:
+    python -m src.autotune                 # tune every model in EMBEDDING_ALLOWED_MODELS and persist the host profile
+    python -m src.autotune --model <name>  # tune a single model
+    python -m src.autotune --force         # re-benchmark even if a profile for this host exists
+
+torch only accepts the inter-op thread count before any parallel work has run,
+so each inter-op candidate is benchmarked in its own subprocess (--worker).
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from .config import (
+    EMBEDDING_ALLOWED_MODELS,
+    AUTOTUNE_PROFILE_DIR,
+    AUTOTUNE_THREAD_CANDIDATES,
+    AUTOTUNE_INTEROP_THREAD_CANDIDATES,
+    AUTOTUNE_MICRO_BATCH_SIZES,
+    AUTOTUNE_PAD_TO_MULTIPLE_OF,
+    AUTOTUNE_LATENCY_CAP_MS,
+    AUTOTUNE_NUM_TEXTS,
+)
+
+class BenchmarkResult(BaseModel):
+    """
+    Measurement of one grid point.
+    """
+    num_threads: int
+    num_interop_threads: int
+    micro_batch_size: int
+    pad_to_multiple_of: Optional[int]
+    throughput: float  # texts per second
+    p95_latency_ms: float  # per micro-batch
+
+class ModelTuning(BaseModel):
+    """
+    Chosen settings for one model.
+    """
+    micro_batch_size: int
+    pad_to_multiple_of: Optional[int]
+    throughput: float
+    p95_latency_ms: float
+
+class TuningProfile(BaseModel):
+    """
+    Persisted autotune result for one kind of host. Thread counts are process-wide, so they are shared by all models.
+    """
+    cpu_model: str
+    cpu_count: int
+    torch_version: str
+    num_threads: int
+    num_interop_threads: int
+    models: Dict[str, ModelTuning]
+
+    def matches_host(self) -> bool:
+        """
+        A profile is only reused on the same CPU model and count with the same torch build it was measured on.
+        """
+        return (self.cpu_model, self.cpu_count, self.torch_version) == host_fingerprint()
+
+def cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+def host_fingerprint() -> Tuple[str, int, str]:
+    """
+    What the measurements depend on. The hostname is deliberately left out: in containers it changes with every
+    container, while a profile stays valid on any host with the same hardware and torch build.
+    """
+    import torch
+    return cpu_model(), os.cpu_count() or 1, torch.__version__
+
+def profile_path(profile_dir: str = AUTOTUNE_PROFILE_DIR) -> str:
+    model, cpu_count, torch_version = host_fingerprint()
+    digest = hashlib.sha256(f"{model}|{torch_version}".encode()).hexdigest()[:12]
+    return os.path.join(profile_dir, f"{cpu_count}cpu-{digest}.json")
+
+def load_profile(profile_dir: str = AUTOTUNE_PROFILE_DIR) -> Optional[TuningProfile]:
+    """
+    Return the persisted profile for this host, or None if missing, unreadable or measured elsewhere.
+    """
+    path = profile_path(profile_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            profile = TuningProfile.model_validate_json(f.read())
+    except (OSError, ValueError):
+        return None
+    return profile if profile.matches_host() else None
+
+def save_profile(profile: TuningProfile, profile_dir: str = AUTOTUNE_PROFILE_DIR) -> str:
+    os.makedirs(profile_dir, exist_ok=True)
+    path = profile_path(profile_dir)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(profile.model_dump_json(indent=2))
+    os.replace(tmp_path, path)  # Atomic, so a concurrently starting worker never reads a partial file
+    return path
+
+def thread_candidates() -> List[int]:
+    if AUTOTUNE_THREAD_CANDIDATES:
+        return list(AUTOTUNE_THREAD_CANDIDATES)
+    cpu_count = os.cpu_count() or 1
+    candidates = [2 ** i for i in range(int(math.log2(cpu_count)) + 1)]
+    if candidates[-1] != cpu_count:
+        candidates.append(cpu_count)
+    return candidates
+
+def synthetic_texts(n: int = AUTOTUNE_NUM_TEXTS, seed: int = 0) -> List[str]:
+    """
+    Deterministic texts with a spread of lengths similar to titles and short descriptions.
+    """
+    words = [
+        "video", "music", "news", "cricket", "politics", "movie", "review", "live", "official", "trailer",
+        "highlights", "interview", "world", "india", "cup", "song", "episode", "full", "best", "new",
+    ]
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(4, 60))) for _ in range(n)]
+
+def benchmark_config(
+    tokenizer,
+    model,
+    texts: List[str],
+    micro_batch_size: int,
+    pad_to_multiple_of: Optional[int],
+) -> Tuple[float, float]:
+    """
+    Embed `texts` in micro-batches and return (throughput in texts/s, p95 micro-batch latency in ms).
+    """
+    import torch
+
+    def run_batch(batch: List[str]) -> None:
+        inputs = tokenizer(batch, return_tensors="pt", truncation=True, padding=True, pad_to_multiple_of=pad_to_multiple_of)
+        with torch.no_grad():
+            outputs = model(**inputs)
+            mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+            ((outputs.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)).tolist()
+
+    run_batch(texts[:micro_batch_size])  # Warm-up
+    latencies = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), micro_batch_size):
+        batch_start = time.perf_counter()
+        run_batch(texts[i:i + micro_batch_size])
+        latencies.append((time.perf_counter() - batch_start) * 1000)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(math.ceil(0.95 * len(latencies))) - 1)]
+    return len(texts) / elapsed, p95
+
+def benchmark_grid(tokenizer, model, num_interop_threads: int, texts: Optional[List[str]] = None) -> List[BenchmarkResult]:
+    """
+    Benchmark every (threads, micro-batch size, padding bucket) combination in the current process.
+    """
+    import torch
+
+    texts = texts or synthetic_texts()
+    results = []
+    original_threads = torch.get_num_threads()
+    try:
+        for num_threads in thread_candidates():
+            torch.set_num_threads(num_threads)
+            for micro_batch_size in AUTOTUNE_MICRO_BATCH_SIZES:
+                for pad_to_multiple_of in AUTOTUNE_PAD_TO_MULTIPLE_OF:
+                    throughput, p95 = benchmark_config(tokenizer, model, texts, micro_batch_size, pad_to_multiple_of)
+                    results.append(BenchmarkResult(
+                        num_threads=num_threads,
+                        num_interop_threads=num_interop_threads,
+                        micro_batch_size=micro_batch_size,
+                        pad_to_multiple_of=pad_to_multiple_of,
+                        throughput=throughput,
+                        p95_latency_ms=p95,
+                    ))
+    finally:
+        torch.set_num_threads(original_threads)
+    return results
+
+def select_best(results: List[BenchmarkResult], latency_cap_ms: float = AUTOTUNE_LATENCY_CAP_MS) -> BenchmarkResult:
+    """
+    Highest throughput among results under the latency cap; the lowest-latency result if none qualifies.
+    """
+    if not results:
+        raise ValueError("No benchmark results to select from.")
+    within_cap = [r for r in results if r.p95_latency_ms <= latency_cap_ms]
+    if within_cap:
+        return max(within_cap, key=lambda r: r.throughput)
+    return min(results, key=lambda r: r.p95_latency_ms)
+
+def build_profile(results_by_model: Dict[str, List[BenchmarkResult]], latency_cap_ms: float = AUTOTUNE_LATENCY_CAP_MS) -> TuningProfile:
+    """
+    Pick process-wide thread counts and per-model batch/padding settings.
+    Thread counts are chosen by the summed throughput (relative to each model's best) of each model's best setting under them.
+    """
+    thread_settings = {(r.num_threads, r.num_interop_threads) for results in results_by_model.values() for r in results}
+    best_threads = None
+    best_score = -1.0
+    for setting in sorted(thread_settings):
+        score = 0.0
+        for results in results_by_model.values():
+            subset = [r for r in results if (r.num_threads, r.num_interop_threads) == setting]
+            if subset:
+                score += select_best(subset, latency_cap_ms).throughput / max(r.throughput for r in results)
+        if score > best_score:
+            best_threads, best_score = setting, score
+    num_threads, num_interop_threads = best_threads
+    models = {}
+    for model_name, results in results_by_model.items():
+        subset = [r for r in results if (r.num_threads, r.num_interop_threads) == best_threads]
+        best = select_best(subset, latency_cap_ms)
+        models[model_name] = ModelTuning(
+            micro_batch_size=best.micro_batch_size,
+            pad_to_multiple_of=best.pad_to_multiple_of,
+            throughput=best.throughput,
+            p95_latency_ms=best.p95_latency_ms,
+        )
+    model, cpu_count, torch_version = host_fingerprint()
+    return TuningProfile(
+        cpu_model=model,
+        cpu_count=cpu_count,
+        torch_version=torch_version,
+        num_threads=num_threads,
+        num_interop_threads=num_interop_threads,
+        models=models,
+    )
+
+def default_loader(model_name: str):
+    from .model_store import has_model, load_from_store
+    if has_model(model_name):
+        return load_from_store(model_name)
+    from transformers import AutoTokenizer, AutoModel
+    return AutoTokenizer.from_pretrained(model_name), AutoModel.from_pretrained(model_name).eval()
+
+def run_worker(model_names: List[str], num_interop_threads: int, loader: Callable = default_loader) -> Dict[str, List[BenchmarkResult]]:
+    """
+    Benchmark all models for one inter-op thread count. Must run in a fresh process.
+    """
+    import torch
+    torch.set_num_interop_threads(num_interop_threads)
+    results = {}
+    for model_name in model_names:
+        tokenizer, model = loader(model_name)
+        results[model_name] = benchmark_grid(tokenizer, model, num_interop_threads)
+    return results
+
+def autotune(model_names: List[str], profile_dir: str = AUTOTUNE_PROFILE_DIR) -> TuningProfile:
+    """
+    Benchmark each inter-op candidate in a subprocess, build the host profile and persist it.
+    """
+    results_by_model: Dict[str, List[BenchmarkResult]] = {m: [] for m in model_names}
+    for num_interop_threads in AUTOTUNE_INTEROP_THREAD_CANDIDATES:
+        cmd = [sys.executable, "-m", "src.autotune", "--worker", "--interop-threads", str(num_interop_threads)]
+        for model_name in model_names:
+            cmd += ["--model", model_name]
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        for model_name, results in json.loads(proc.stdout.strip().splitlines()[-1]).items():
+            results_by_model[model_name].extend(BenchmarkResult(**r) for r in results)
+    profile = build_profile(results_by_model)
+    save_profile(profile, profile_dir)
+    return profile
+
+def apply_profile(profile: TuningProfile) -> None:
+    """
+    Apply the process-wide thread settings. Call at startup, before any inference.
+    """
+    import torch
+    torch.set_num_threads(profile.num_threads)
+    try:
+        torch.set_num_interop_threads(profile.num_interop_threads)
+    except RuntimeError:
+        pass  # Inter-op pool already started (e.g. reload in the same process); keep the current size
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark embedding models and persist the best settings for this host.")
+    parser.add_argument("--model", action="append", help="Model to tune (repeatable). Defaults to EMBEDDING_ALLOWED_MODELS.")
+    parser.add_argument("--force", action="store_true", help="Re-benchmark even if this host already has a profile.")
+    parser.add_argument("--profile-dir", default=AUTOTUNE_PROFILE_DIR)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--interop-threads", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        results = run_worker(args.model, args.interop_threads)
+        print(json.dumps({m: [r.model_dump() for r in rs] for m, rs in results.items()}))
+        return
+    model_names = args.model or EMBEDDING_ALLOWED_MODELS
+    if not args.force and load_profile(args.profile_dir) is not None:
+        print(f"Profile already exists for this host: {profile_path(args.profile_dir)} (use --force to re-benchmark)")
+        return
+    profile = autotune(model_names, args.profile_dir)
+    print(profile.model_dump_json(indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from .classifier_models import TextItem, TopicItem, ClassifyTextsRequest, ClassificationResult, ClassifyTextsResponse
 from .classifier_backends import get_classifier_backend
+from .admission import admission_controller
+from .profiling import trace_stage
+from .deadlines import CancellationToken, resolve_timeout_ms, run_cancellable
+from .fast_io import json_body, openapi_body
 from .config import ALLOWED_PROVIDERS, ALLOWED_MODELS, DEFAULT_TEXT_CLASSIFIER_BACKEND, GEMINI_MODEL_NAME
 
 router = APIRouter()
@@ -10,8 +16,13 @@ router = APIRouter()
     response_model=ClassifyTextsResponse,
     summary="Classify texts into topics using LLM or embedding models.",
     tags=["Text Classification"],
+    openapi_extra=openapi_body(ClassifyTextsRequest),
 )
-def classify_texts(request: ClassifyTextsRequest) -> ClassifyTextsResponse:
+async def classify_texts(
+    http_request: Request,
+    request: ClassifyTextsRequest = Depends(json_body(ClassifyTextsRequest)),
+    x_request_timeout_ms: Optional[str] = Header(None),
+) -> ORJSONResponse:
     """
     Classify a batch of texts into the given topics using the configured or requested backend/model.
 
@@ -21,6 +32,11 @@ def classify_texts(request: ClassifyTextsRequest) -> ClassifyTextsResponse:
     - If GEMINI is used and the API key is missing, returns 500 or raises ValueError.
     - The response contains, for each text, a list of topic IDs it belongs to (empty if none).
     - Supports batch classification in a single call.
+    - **timeout_ms** (or the X-Request-Timeout-Ms header): Optional deadline. When it passes, or the client disconnects,
+      outstanding work (e.g. remaining Gemini chunks) is dropped and the texts classified so far are returned with `partial: true`.
+      Returns 504 if nothing was classified before the deadline.
+    - Returns 503 with a Retry-After header if the adaptive concurrency limit for the provider/model is reached.
+    - The body is parsed straight from bytes and the response encoded with orjson (see src/fast_io.py).
     """
     # Determine provider
     provider = (request.provider or DEFAULT_TEXT_CLASSIFIER_BACKEND).upper()
@@ -31,7 +47,21 @@ def classify_texts(request: ClassifyTextsRequest) -> ClassifyTextsResponse:
     model_name = request.model_name or (GEMINI_MODEL_NAME if provider == "GEMINI" else None)
     if model_name not in allowed_models:
         raise HTTPException(status_code=400, detail=f"Invalid model_name '{model_name}' for provider '{provider}'. Allowed: {allowed_models}")
-    # Get backend and classify
-    backend = get_classifier_backend(provider=provider, model_name=model_name)
-    results = backend.classify(request.texts, request.topics)
-    return ClassifyTextsResponse(results=results)
+    token = CancellationToken(resolve_timeout_ms(request.timeout_ms, x_request_timeout_ms))
+
+    def classify() -> List[ClassificationResult]:
+        # Get backend and classify. The backend is built in the threadpool too: creating a Gemini client takes
+        # tens of milliseconds and would block the event loop.
+        backend = get_classifier_backend(provider=provider, model_name=model_name)
+        return backend.classify(request.texts, request.topics, cancellation=token)
+
+    with admission_controller.admit("/classify-texts", f"{provider}:{model_name}"):
+        with trace_stage("classify"):
+            results = await run_cancellable(http_request, token, classify)
+    if not results and token.should_stop():
+        raise HTTPException(status_code=504, detail="Deadline exceeded before any text was classified.")
+    with trace_stage("serialize"):
+        return ORJSONResponse({
+            "results": [{"text_id": r.text_id, "topic_ids": r.topic_ids} for r in results],
+            "partial": len(results) < len(request.texts),
+        })
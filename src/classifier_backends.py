@@ -7,6 +7,7 @@ from .config import (
     GEMINI_RATE_LIMIT_PER_DAY,
 )
 from .gemini_client import GeminiClient
+from .deadlines import CancellationToken
 from fastapi import HTTPException
 from limits import RateLimitItemPerMinute, RateLimitItemPerDay
 from limits.storage import MemoryStorage
@@ -36,10 +37,11 @@ class InMemoryRateLimiter(RateLimiter):
 # Abstract base class for all classifier backends
 class TextClassifierBackend(ABC):
     @abstractmethod
-    def classify(self, texts: List[TextItem], topics: List[TopicItem]) -> List[ClassificationResult]:
+    def classify(self, texts: List[TextItem], topics: List[TopicItem], cancellation: Optional[CancellationToken] = None) -> List[ClassificationResult]:
         """
         Classify each text into the given topics.
         Returns a list of ClassificationResult objects.
+        If `cancellation` stops (deadline or client disconnect), returns results only for the texts classified so far.
         """
         pass
 
@@ -47,13 +49,15 @@ class TextClassifierBackend(ABC):
 class MockTextClassifier(TextClassifierBackend):
     def __init__(self, model_name: Optional[str] = None, rate_limiter: Optional[RateLimiter] = None):
         self.rate_limiter = rate_limiter or InMemoryRateLimiter(per_minute=10, per_day=100)  # Example limits for mock
-    def classify(self, texts: List[TextItem], topics: List[TopicItem]) -> List[ClassificationResult]:
+    def classify(self, texts: List[TextItem], topics: List[TopicItem], cancellation: Optional[CancellationToken] = None) -> List[ClassificationResult]:
         key = "mock_global"
         reason = self.rate_limiter.check_limit(key)
         if reason:
             raise HTTPException(status_code=429, detail=f"Mock {reason}")
         results = []
         for text_item in texts:
+            if cancellation and cancellation.should_stop():
+                break
             matched_topic_ids = [
                 topic.id for topic in topics if topic.topic.lower() in text_item.text.lower()
             ]
@@ -67,18 +71,19 @@ class GeminiTextClassifier(TextClassifierBackend):
         self.rate_limiter = rate_limiter or InMemoryRateLimiter(
             per_minute=GEMINI_RATE_LIMIT_PER_MINUTE, per_day=GEMINI_RATE_LIMIT_PER_DAY
         )
-    def classify(self, texts: List[TextItem], topics: List[TopicItem]) -> List[ClassificationResult]:
+    def classify(self, texts: List[TextItem], topics: List[TopicItem], cancellation: Optional[CancellationToken] = None) -> List[ClassificationResult]:
         key = "gemini_global"
         reason = self.rate_limiter.check_limit(key)
         if reason:
             raise HTTPException(status_code=429, detail=f"Gemini {reason}")
         texts_dicts = [{"id": t.id, "text": t.text} for t in texts]
         topics_dicts = [{"id": t.id, "topic": t.topic} for t in topics]
-        id_to_topic_ids = self.client.classify_texts(texts_dicts, topics_dicts)
+        id_to_topic_ids = self.client.classify_texts(texts_dicts, topics_dicts, cancellation=cancellation)
         results = []
         for text in texts:
-            topic_ids = id_to_topic_ids.get(text.id, [])
-            results.append(ClassificationResult(text_id=text.id, topic_ids=topic_ids))
+            if text.id not in id_to_topic_ids:
+                continue  # Its chunk was dropped by the deadline or a client disconnect
+            results.append(ClassificationResult(text_id=text.id, topic_ids=id_to_topic_ids[text.id]))
         return results
 
 # Factory function to select backend
@@ -20,11 +20,13 @@ class ClassifyTextsRequest(BaseModel):
     Request model for batch text classification.
     - provider: Optional. Preferred model provider (e.g., 'GEMINI', 'MOCK'). If not provided, uses config default.
     - model_name: Optional. Preferred model name (e.g., 'gemini-2.5-flash'). If not provided, uses config default for the provider.
+    - timeout_ms: Optional. Deadline for the request; texts not classified by then are left out of the response.
     """
     texts: List[TextItem] = Field(..., description="List of texts to classify.", min_items=1, example=[{"id": "t1", "text": "Example text."}])
     topics: List[TopicItem] = Field(..., description="List of topics to classify into.", min_items=1, example=[{"id": "p", "topic": "Politics"}])
     provider: Optional[str] = Field(None, description="Preferred model provider (e.g., 'GEMINI', 'MOCK'). Optional.", example="GEMINI")
     model_name: Optional[str] = Field(None, description="Preferred model name (e.g., 'gemini-2.5-flash'). Optional.", example="gemini-2.5-flash")
+    timeout_ms: Optional[int] = Field(None, gt=0, description="Request deadline in milliseconds (overrides the X-Request-Timeout-Ms header). Optional.", example=5000)
 
 class ClassificationResult(BaseModel):
     """
@@ -38,3 +40,4 @@ class ClassifyTextsResponse(BaseModel):
     Response model for batch text classification.
     """
     results: List[ClassificationResult] = Field(..., description="Classification results for each text.", example=[{"text_id": "t1", "topic_ids": ["p"]}])
+    partial: bool = Field(False, description="True if the deadline passed or the client disconnected first; results then cover only the classified texts.")
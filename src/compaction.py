@@ -0,0 +1,264 @@
+"""
+Output compaction for embedding responses: dimension reduction, L2 normalization and low-precision encodings.
+
+Steps run in this order on the pooled embeddings: projection to `dimensions` (truncate or PCA), L2 normalization,
+then quantization to `dtype` and encoding as JSON numbers or base64 bytes.
+
+PCA projections are fitted offline and shipped in the model store next to the weights:
+    python -m src.compaction fit-pca --model <name> --texts-file <one text per line>
+fit-pca also copies the projection to MODEL_ARTIFACTS_DIR, from which `python -m src.model_store fetch` (and so the
+Docker build) installs it into a freshly fetched store.
+    python -m src.compaction evaluate --model <name> --texts-file <file>   # cosine agreement and payload size per option
+"""
+import argparse
+import base64
+import json
+import os
+import threading
+from typing import Dict, List, Literal, NamedTuple, Optional, Tuple, Union
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+from .model_store import ModelStoreError, add_artifact, current_revision, export_artifact, revision_dir
+
+PCA_FILE = "pca.safetensors"
+INT8_MAX = 127
+ITEM_SIZES = {"float32": 4, "float16": 2, "int8": 1}
+
+class EmbeddingOutputOptions(BaseModel):
+    """
+    Request options controlling the embedding output. Defaults reproduce the full-width float32 JSON output.
+    normalize: L2-normalize each vector (dot product == cosine similarity).
+    dimensions: Target dimension; None keeps the model dimension.
+    projection: How to reduce to `dimensions`: 'truncate' keeps the leading components, 'pca' applies the model's shipped PCA projection.
+    dtype: 'float32', 'float16', or 'int8' (symmetric per-vector scale; value ~= int * scale).
+    encoding_format: 'float' for JSON numbers, 'base64' for little-endian packed bytes of `dtype`.
+    """
+    normalize: bool = False
+    dimensions: Optional[int] = Field(None, gt=0)
+    projection: Literal["truncate", "pca"] = "truncate"
+    dtype: Literal["float32", "float16", "int8"] = "float32"
+    encoding_format: Literal["float", "base64"] = "float"
+
+    def is_default(self) -> bool:
+        return (
+            not self.normalize
+            and self.dimensions is None
+            and self.dtype == "float32"
+            and self.encoding_format == "float"
+        )
+
+class CompactedEmbedding(NamedTuple):
+    data: Union[List[float], List[int], str]
+    scale: Optional[float]  # Only for int8
+
+class PcaProjection(NamedTuple):
+    mean: "torch.Tensor"  # (d,)
+    components: "torch.Tensor"  # (k, d), rows sorted by explained variance
+
+_pca_cache: Dict[Tuple[str, str], PcaProjection] = {}
+_pca_lock = threading.Lock()
+
+def load_pca_projection(model_name: str) -> PcaProjection:
+    """
+    Load (and cache) the PCA projection shipped with the model's current store revision.
+    Raises HTTPException(400) if the model has none.
+    """
+    from safetensors.torch import load_file
+
+    revision = current_revision(model_name)
+    key = (model_name, str(revision))
+    with _pca_lock:
+        if key in _pca_cache:
+            return _pca_cache[key]
+        path = os.path.join(revision_dir(model_name), PCA_FILE) if revision else None
+        if not path or not os.path.exists(path):
+            raise HTTPException(status_code=400, detail=f"No PCA projection is shipped with model '{model_name}'. Use projection='truncate'.")
+        tensors = load_file(path)
+        _pca_cache[key] = PcaProjection(mean=tensors["mean"], components=tensors["components"])
+        return _pca_cache[key]
+
+def _encode_row(row, encoding_format: str, little_endian_dtype: str):
+    if encoding_format == "base64":
+        return base64.b64encode(row.numpy().astype(little_endian_dtype, copy=False).tobytes()).decode("ascii")
+    return row.tolist()
+
+def shortest_float16_decimals(values: "np.ndarray") -> "np.ndarray":
+    """
+    float64 copy of a float16 array where each value has the fewest significant digits that still round to the same
+    float16 (e.g. -0.3376 instead of the exact -0.337646484375), so JSON numbers are as short as the precision allows.
+    """
+    import numpy as np
+
+    exact = values.astype(np.float64)
+    out = exact.copy()
+    magnitude = np.floor(np.log10(np.abs(exact), where=exact != 0, out=np.zeros_like(exact)))
+    done = ~np.isfinite(exact)
+    with np.errstate(over="ignore"):
+        for digits in range(1, 6):  # 5 significant digits always round-trip a float16
+            exponent = digits - 1 - magnitude
+            scale = 10.0 ** np.abs(exponent)
+            # Divide by an exact power of ten rather than multiply by an inexact 0.01, 0.001, ...
+            candidate = np.where(exponent >= 0, np.round(exact * scale) / scale, np.round(exact / scale) * scale)
+            ok = ~done & (candidate.astype(np.float16) == values)
+            out[ok] = candidate[ok]
+            done |= ok
+    return out
+
+def compact_embeddings(pooled: "torch.Tensor", options: EmbeddingOutputOptions, model_name: str) -> List[CompactedEmbedding]:
+    """
+    Apply the output options to a (n, d) tensor of pooled embeddings.
+    Raises HTTPException(400) for a dimension larger than the model (or PCA) provides.
+    """
+    import torch
+
+    if options.is_default():
+        return [CompactedEmbedding(row, None) for row in pooled.tolist()]
+    x = pooled.float()
+    if options.dimensions is not None:
+        if options.projection == "pca":
+            pca = load_pca_projection(model_name)
+            if options.dimensions > pca.components.shape[0]:
+                raise HTTPException(status_code=400, detail=f"dimensions must be <= {pca.components.shape[0]} for the PCA projection of '{model_name}'.")
+            x = (x - pca.mean) @ pca.components[:options.dimensions].T
+        else:
+            if options.dimensions > x.shape[1]:
+                raise HTTPException(status_code=400, detail=f"dimensions must be <= {x.shape[1]} for model '{model_name}'.")
+            x = x[:, :options.dimensions]
+    if options.normalize:
+        x = torch.nn.functional.normalize(x, p=2, dim=1)
+    if options.dtype == "int8":
+        scales = x.abs().amax(dim=1).clamp(min=1e-12) / INT8_MAX
+        q = torch.round(x / scales.unsqueeze(1)).clamp(-INT8_MAX, INT8_MAX).to(torch.int8)
+        return [
+            CompactedEmbedding(_encode_row(row, options.encoding_format, "<i1"), scale)
+            for row, scale in zip(q, scales.tolist())
+        ]
+    if options.dtype == "float16":
+        if options.encoding_format == "float":
+            return [CompactedEmbedding(row, None) for row in shortest_float16_decimals(x.half().numpy()).tolist()]
+        return [CompactedEmbedding(_encode_row(row, options.encoding_format, "<f2"), None) for row in x.half()]
+    return [CompactedEmbedding(_encode_row(row, options.encoding_format, "<f4"), None) for row in x]
+
+def embedding_size(data: Union[List[float], List[int], str], dtype: str) -> int:
+    """
+    Number of dimensions in a compacted embedding.
+    """
+    if isinstance(data, str):
+        return len(base64.b64decode(data)) // ITEM_SIZES[dtype]
+    return len(data)
+
+def decode_embedding(data: Union[List[float], List[int], str], dtype: str, scale: Optional[float] = None) -> List[float]:
+    """
+    Client-side reference decoder: turn a compacted embedding back into floats.
+    """
+    import numpy as np
+
+    little_endian_dtype = {"float32": "<f4", "float16": "<f2", "int8": "<i1"}[dtype]
+    if isinstance(data, str):
+        values = np.frombuffer(base64.b64decode(data), dtype=little_endian_dtype).astype(np.float32)
+    else:
+        values = np.asarray(data, dtype=np.float32)
+    if dtype == "int8":
+        values = values * (scale if scale is not None else 1.0)
+    return values.tolist()
+
+def fit_pca(embeddings: "torch.Tensor", center: bool = False) -> PcaProjection:
+    """
+    Fit PCA on a (n, d) tensor; keeps min(n, d) components.
+    Uncentered by default: the projection then best preserves the original dot products (and so cosine similarities),
+    which is what clients compare. Centering removes the direction shared by all embeddings and changes cosines.
+    """
+    import torch
+
+    x = embeddings.float()
+    mean = x.mean(dim=0) if center else torch.zeros(x.shape[1])
+    _, _, vh = torch.linalg.svd(x - mean, full_matrices=False)
+    return PcaProjection(mean=mean.contiguous(), components=vh.contiguous())
+
+def save_pca_projection(model_name: str, projection: PcaProjection) -> str:
+    """
+    Write the projection into the model's current store revision and record it in the manifest.
+    """
+    from safetensors.torch import save_file
+
+    path = os.path.join(revision_dir(model_name), PCA_FILE)
+    save_file({"mean": projection.mean, "components": projection.components}, path)
+    add_artifact(model_name, PCA_FILE)
+    return path
+
+def _read_texts(path: str) -> List[str]:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+def _embed(model_name: str, texts: List[str]) -> "torch.Tensor":
+    import torch
+    from main import encode_texts  # Same tokenization and pooling as the API
+
+    return torch.cat([encode_texts(texts[i:i + 64], model_name) for i in range(0, len(texts), 64)])
+
+def evaluate(model_name: str, texts: List[str]) -> List[Dict[str, object]]:
+    """
+    For each compaction variant: mean/max absolute error of pairwise cosine similarities against
+    the full float32 embeddings, and how many times smaller the JSON payload is.
+    """
+    import torch
+
+    pooled = _embed(model_name, texts)
+    full = torch.nn.functional.normalize(pooled.float(), dim=1)
+    baseline_bytes = len(json.dumps([c.data for c in compact_embeddings(pooled, EmbeddingOutputOptions(), model_name)]))
+    dims = pooled.shape[1]
+    variants = []
+    for dimensions in (None, dims // 2, dims // 4):
+        for projection in ("truncate", "pca"):
+            if projection == "pca" and dimensions is None:
+                continue
+            for dtype, encoding_format in (("float32", "float"), ("float16", "base64"), ("int8", "float"), ("int8", "base64")):
+                variants.append(EmbeddingOutputOptions(
+                    normalize=True, dimensions=dimensions, projection=projection, dtype=dtype, encoding_format=encoding_format
+                ))
+    report = []
+    for options in variants:
+        try:
+            compacted = compact_embeddings(pooled, options, model_name)
+        except HTTPException:
+            continue  # e.g. no PCA projection shipped with the model
+        decoded = torch.tensor([decode_embedding(c.data, options.dtype, c.scale) for c in compacted])
+        # Cosine structure is what clients use: compare pairwise similarities, not vectors of different spaces
+        full_sims = full @ full.T
+        compact_norm = torch.nn.functional.normalize(decoded, dim=1)
+        compact_sims = compact_norm @ compact_norm.T
+        errors = (full_sims - compact_sims).abs()
+        payload = json.dumps([c.data for c in compacted]) + json.dumps([c.scale for c in compacted] if options.dtype == "int8" else None)
+        report.append({
+            "options": options.model_dump(),
+            "mean_abs_cosine_error": round(errors.mean().item(), 5),
+            "max_abs_cosine_error": round(errors.max().item(), 5),
+            "payload_reduction": round(baseline_bytes / len(payload), 2),
+        })
+    return report
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Fit and evaluate embedding output compaction.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    fit_parser = subparsers.add_parser("fit-pca", help="Fit a PCA projection and ship it with the stored model.")
+    fit_parser.add_argument("--model", required=True)
+    fit_parser.add_argument("--texts-file", required=True, help="Representative texts, one per line (at least as many as the model dimension).")
+    eval_parser = subparsers.add_parser("evaluate", help="Report accuracy and payload size per compaction option.")
+    eval_parser.add_argument("--model", required=True)
+    eval_parser.add_argument("--texts-file", required=True)
+    args = parser.parse_args(argv)
+    texts = _read_texts(args.texts_file)
+    if args.command == "fit-pca":
+        try:
+            projection = fit_pca(_embed(args.model, texts))
+            path = save_pca_projection(args.model, projection)
+            exported = export_artifact(args.model, PCA_FILE)
+        except ModelStoreError as e:
+            parser.exit(1, f"{e} Fetch it with 'python -m src.model_store fetch' first.\n")
+        print(f"Saved {projection.components.shape[0]} components to {path} (and {exported} for image builds)")
+        return
+    for row in evaluate(args.model, texts):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 # src/config.py
+import os
 
 # Default Gemini model name
 GEMINI_MODEL_NAME = "gemini-2.5-flash"
@@ -12,6 +13,12 @@ ALLOWED_MODELS = {
     "MOCK": [None],  # Mock does not use a model name
 }
 
+# Embedding models allowed in production; also the default models for the model store and autotune CLIs
+EMBEDDING_ALLOWED_MODELS = [
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+    # Add more allowed model names here
+]
+
 # Set default backend to MOCK for testing
 DEFAULT_TEXT_CLASSIFIER_BACKEND = "MOCK"
 
@@ -19,4 +26,81 @@ DEFAULT_TEXT_CLASSIFIER_BACKEND = "MOCK"
 GEMINI_RATE_LIMIT_PER_MINUTE = 60
 GEMINI_RATE_LIMIT_PER_DAY = 1000
 
+# Adaptive admission control (per endpoint + model).
+# The concurrency limit starts at the initial value and is adjusted with AIMD:
+# +1 after each request that meets the SLO while the limit is in use, multiplied
+# by the backoff ratio after each request that misses it.
+ADMISSION_INITIAL_CONCURRENCY = 4
+ADMISSION_MIN_CONCURRENCY = 1
+ADMISSION_MAX_CONCURRENCY = 32
+ADMISSION_BACKOFF_RATIO = 0.8
+# Seconds a shed client is told to wait before retrying (Retry-After header)
+ADMISSION_RETRY_AFTER_SECONDS = 1
+
+# Latency SLOs in milliseconds, per endpoint.
+# /batch-embeddings is measured per micro-batch (its slowest one), since the whole request grows with the batch size.
+LATENCY_SLO_MS = {
+    "/embeddings": 250,
+    "/batch-embeddings": 500,
+    "/classify-texts": 10000,
+}
+
+# Micro-batch size for /batch-embeddings. Shrinks (halves) when a single
+# micro-batch exceeds its SLO and grows back by one when it is under it.
+EMBEDDING_MAX_MICRO_BATCH_SIZE = 32
+EMBEDDING_MIN_MICRO_BATCH_SIZE = 1
+EMBEDDING_MICRO_BATCH_SLO_MS = 500
+
+# Slow request tracing: requests slower than the threshold keep their per-stage timing breakdown
+SLOW_REQUEST_THRESHOLD_MS = 1000
+SLOW_TRACE_BUFFER_SIZE = 100
+
+# On-demand profiling (/admin/profile)
+PROFILER_SAMPLE_INTERVAL_MS = 10
+PROFILER_MAX_SECONDS = 60
+
+# Startup autotuner (python -m src.autotune, or APP_AUTOTUNE=1 at startup).
+# Each model is benchmarked over the grid below with synthetic inputs; the configuration with the best
+# throughput whose p95 micro-batch latency is under the cap is persisted per CPU model/count and torch version
+# and reused on later startups. Keep AUTOTUNE_PROFILE_DIR on a volume so new containers find it.
+AUTOTUNE_PROFILE_DIR = os.getenv("AUTOTUNE_PROFILE_DIR", "tuning_profiles")
+AUTOTUNE_THREAD_CANDIDATES = None  # None: 1, 2, 4, ... up to the CPU count
+AUTOTUNE_INTEROP_THREAD_CANDIDATES = [1, 2]
+AUTOTUNE_MICRO_BATCH_SIZES = [1, 4, 8, 16, 32]
+AUTOTUNE_PAD_TO_MULTIPLE_OF = [None, 8, 32]  # Sequence length buckets; None pads to the longest text only
+AUTOTUNE_LATENCY_CAP_MS = EMBEDDING_MICRO_BATCH_SLO_MS
+AUTOTUNE_NUM_TEXTS = 64
+
+# Request deadlines and client disconnect detection
+MAX_REQUEST_TIMEOUT_MS = 120000  # Upper bound for timeout_ms / X-Request-Timeout-Ms
+DISCONNECT_POLL_INTERVAL_MS = 100
+
+# Texts per Gemini call; the deadline and client disconnect are checked between chunks.
+# Without a deadline only a disconnect can stop the work, so chunks are larger (fewer calls and repeated topic prompts).
+GEMINI_CLASSIFY_CHUNK_SIZE = 50
+GEMINI_CLASSIFY_CHUNK_SIZE_NO_DEADLINE = 100
+
+# Local model artifact store (python -m src.model_store). Stored models load from disk without the hub.
+# With MODEL_STORE_OFFLINE=1 models missing from the store are rejected instead of downloaded.
+MODEL_STORE_DIR = os.getenv("MODEL_STORE_DIR", "model_store")
+MODEL_STORE_OFFLINE = os.getenv("MODEL_STORE_OFFLINE", "0") == "1"
+# Files fitted offline for stored models (e.g. PCA projections), as <model name with '/' -> '--'>/<file>.
+# `python -m src.model_store fetch` installs them into the fetched revision, so they ship in the Docker image.
+MODEL_ARTIFACTS_DIR = os.getenv("MODEL_ARTIFACTS_DIR", "model_artifacts")
+
+# Opt-in traffic capture for offline replay (python -m src.replay). Captured payloads contain user texts.
+TRAFFIC_CAPTURE_ENABLED = os.getenv("TRAFFIC_CAPTURE", "0") == "1"
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "0.01"))
+TRAFFIC_CAPTURE_DIR = os.getenv("TRAFFIC_CAPTURE_DIR", "captures")
+TRAFFIC_CAPTURE_PATHS = ["/classify-texts", "/embeddings", "/batch-embeddings"]
+TRAFFIC_CAPTURE_MAX_FILE_BYTES = 50 * 1024 * 1024
+TRAFFIC_CAPTURE_MAX_FILES = 20
+TRAFFIC_CAPTURE_QUEUE_SIZE = 1000
+
+# Compression of large responses (src/fast_io.py): zstd or gzip as negotiated with Accept-Encoding;
+# zstd needs the zstandard package. Embedding floats compress ~2x at any level, so the fastest levels are used.
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_GZIP_LEVEL = 1
+COMPRESSION_ZSTD_LEVEL = 1
+
 # Add other project-wide configs here as needed
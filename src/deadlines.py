@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Optional
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from .config import DISCONNECT_POLL_INTERVAL_MS, MAX_REQUEST_TIMEOUT_MS
+
+# Header alternative to the timeout_ms request field
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+
+class CancellationToken:
+    """
+    Tells long-running work to stop early, either because the request deadline passed
+    or because the client disconnected. Work checks `should_stop()` between units
+    (micro-batches, Gemini chunks) and returns what it has so far.
+    """
+    def __init__(self, timeout_ms: Optional[float] = None):
+        self.deadline = time.monotonic() + timeout_ms / 1000 if timeout_ms is not None else None
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def should_stop(self) -> bool:
+        return self.cancelled or self.expired
+
+    def remaining_ms(self) -> Optional[float]:
+        """
+        Milliseconds left before the deadline (never negative), or None without a deadline.
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, (self.deadline - time.monotonic()) * 1000)
+
+def resolve_timeout_ms(field_value: Optional[int], header_value: Optional[str]) -> Optional[int]:
+    """
+    Request timeout from the body field, else the header, capped at MAX_REQUEST_TIMEOUT_MS.
+    Raises HTTPException(400) for a malformed or non-positive header.
+    """
+    timeout_ms = field_value
+    if timeout_ms is None and header_value is not None:
+        try:
+            timeout_ms = int(header_value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid {REQUEST_TIMEOUT_HEADER} header '{header_value}'.")
+        if timeout_ms <= 0:
+            raise HTTPException(status_code=400, detail=f"{REQUEST_TIMEOUT_HEADER} must be positive.")
+    if timeout_ms is None:
+        return None
+    return min(timeout_ms, MAX_REQUEST_TIMEOUT_MS)
+
+async def _watch_disconnect(request: Request, token: CancellationToken) -> None:
+    while not token.should_stop():
+        if await request.is_disconnected():
+            token.cancel()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL_MS / 1000)
+
+async def run_cancellable(request: Request, token: CancellationToken, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run blocking `func` in the threadpool while watching for client disconnect.
+    A disconnect cancels `token`; `func` is expected to check it and return early.
+    """
+    watcher = asyncio.create_task(_watch_disconnect(request, token))
+    try:
+        return await run_in_threadpool(func, *args, **kwargs)
+    finally:
+        watcher.cancel()
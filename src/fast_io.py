@@ -0,0 +1,280 @@
+"""
+Fast request decoding, response encoding and negotiated compression for the large JSON endpoints.
+
+- json_body(Model): dependency that validates the raw request bytes with Model.model_validate_json, i.e. pydantic-core's
+  Rust JSON parser builds the model directly instead of json.loads building dicts that are validated afterwards.
+  Validation errors are the same 422 responses FastAPI returns for a regular body parameter.
+- openapi_body(Model) documents the body as a $ref to Model, and add_body_schemas(app) registers Model (and the models
+  it references) in components.schemas, so the OpenAPI schema is the same as for a regular body parameter.
+- Endpoints return ORJSONResponse (orjson) with plain dicts, which skips re-validating every float of the
+  response against response_model; response_model is still declared so the response schema is documented.
+- CompressionMiddleware: zstd or gzip, as negotiated with Accept-Encoding, for responses above COMPRESSION_MIN_BYTES.
+
+Benchmark: python -m src.fast_io
+"""
+import argparse
+import gzip
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Type
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from pydantic.json_schema import models_json_schema
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from .profiling import trace_stage
+from .config import COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, COMPRESSION_ZSTD_LEVEL
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+COMPRESSIBLE_CONTENT_TYPES = ("application/json", "text/")
+COMPONENTS_REF_TEMPLATE = "#/components/schemas/{model}"
+
+_body_models: Dict[str, Type[BaseModel]] = {}  # Models documented with openapi_body, by component name
+
+def json_body(model: Type[BaseModel]) -> Callable:
+    """
+    FastAPI dependency parsing the request body straight from bytes into `model`.
+    Use together with openapi_body(model) so the docs still show the request schema.
+    """
+    async def parse(request: Request) -> BaseModel:
+        body = await request.body()
+        try:
+            with trace_stage("validate"):
+                return model.model_validate_json(body)
+        except ValidationError as e:
+            raise _body_error(model, body, e) from None
+    return parse
+
+def _body_error(model: Type[BaseModel], body: bytes, error: ValidationError) -> Exception:
+    """
+    The error FastAPI raises for an invalid `body` of a regular `model` body parameter. The body is parsed again with
+    json.loads and validated as a dict, which only happens for rejected requests.
+    """
+    if not body:
+        return RequestValidationError([{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}])
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError as e:
+        return RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body", e.pos), "msg": "JSON decode error", "input": {}, "ctx": {"error": e.msg}}],
+            body=e.doc,
+        )
+    except UnicodeDecodeError:
+        return HTTPException(status_code=400, detail="There was an error parsing the body")
+    try:
+        model.model_validate(data, from_attributes=True)
+        errors = error.errors(include_url=False)  # Valid as a dict, e.g. JSON-mode-only constraints
+    except ValidationError as e:
+        errors = e.errors(include_url=False)
+    return RequestValidationError([{**e, "loc": ("body", *e["loc"])} for e in errors], body=data)
+
+def openapi_body(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    `openapi_extra` documenting `model` as the JSON request body of a route that parses it with json_body.
+    The referenced component is added to the schema by add_body_schemas.
+    """
+    _body_models[model.__name__] = model
+    return {
+        "requestBody": {
+            "content": {"application/json": {"schema": {"$ref": COMPONENTS_REF_TEMPLATE.format(model=model.__name__)}}},
+            "required": True,
+        }
+    }
+
+def add_body_schemas(app: FastAPI) -> None:
+    """
+    Extend app.openapi to add the models documented with openapi_body, and the models they reference, to components.schemas.
+    """
+    default_openapi = app.openapi
+
+    def openapi() -> Dict[str, Any]:
+        if app.openapi_schema is None:
+            schema = default_openapi()
+            models = [(model, "validation") for model in _body_models.values()]
+            _, definitions = models_json_schema(models, ref_template=COMPONENTS_REF_TEMPLATE)
+            components = schema.setdefault("components", {}).setdefault("schemas", {})
+            for name, definition in definitions.get("$defs", {}).items():
+                # exclude_none as FastAPI's own schema, which e.g. leaves out `"default": None`
+                components.setdefault(name, jsonable_encoder(definition, exclude_none=True))
+            schema["components"]["schemas"] = dict(sorted(components.items()))
+        return app.openapi_schema
+
+    app.openapi = openapi
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header into {encoding: q}.
+    """
+    encodings = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    'zstd' or 'gzip' (preferring the higher q, zstd on ties), or None to send the response uncompressed.
+    """
+    encodings = accepted_encodings(accept_encoding)
+    wildcard = encodings.get("*", 0.0)
+    candidates = (["zstd"] if zstandard is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for name in candidates:
+        q = encodings.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+def compress(body: bytes, encoding: str, gzip_level: int = COMPRESSION_GZIP_LEVEL, zstd_level: int = COMPRESSION_ZSTD_LEVEL) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=zstd_level).compress(body)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing JSON/text responses of at least `minimum_size` bytes with the encoding negotiated
+    from Accept-Encoding, in the threadpool. Streamed responses and responses that already have a Content-Encoding pass through.
+    Add it after middlewares that need to read response bodies (e.g. traffic capture) so it runs outside them.
+    """
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_BYTES,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        zstd_level: int = COMPRESSION_ZSTD_LEVEL,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        state: Dict[str, Any] = {"start": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_CONTENT_TYPES):
+                    state["passthrough"] = True
+                    await send(message)
+                else:
+                    state["start"] = message  # Held until the body shows whether it is worth compressing
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+            start, state["start"] = state["start"], None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                state["passthrough"] = True  # Streamed or small: not buffered, sent as is
+                await send(start)
+                await send(message)
+                return
+            # Off the event loop: compressing a large batch response takes milliseconds
+            compressed = await run_in_threadpool(compress, body, encoding, self.gzip_level, self.zstd_level)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
+
+def _timeit(func: Callable[[], Any], repeat: int) -> float:
+    func()  # Warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+def benchmark(num_texts: int = 256, dims: int = 384, repeat: int = 20) -> List[Dict[str, Any]]:
+    """
+    Time the previous and the fast path for a /batch-embeddings sized payload: request decoding, response encoding
+    (pydantic response model + stdlib json vs dict + orjson) and compression. Returns one row per measurement.
+    The previous path encodes with the response model /batch-embeddings had before the dtype and encoding options.
+    """
+    import random
+    import orjson
+    from main import BatchEmbeddingRequest
+
+    class PreviousBatchEmbeddingResponse(BaseModel):
+        embeddings: List[List[float]]
+        model: str
+        embedding_size: int
+
+    rng = random.Random(0)
+    texts = [" ".join(f"word{rng.randint(0, 5000)}" for _ in range(rng.randint(5, 60))) for _ in range(num_texts)]
+    request_bytes = json.dumps({"texts": texts, "model_name": "model"}).encode()
+    vectors = [[rng.uniform(-1, 1) for _ in range(dims)] for _ in range(num_texts)]
+    content = {
+        "embeddings": vectors, "model": "model", "embedding_size": dims, "partial": False,
+        "dtype": "float32", "encoding_format": "float", "normalized": False, "scales": None,
+    }
+
+    def decode_stdlib():
+        BatchEmbeddingRequest.model_validate(json.loads(request_bytes))
+
+    def decode_fast():
+        BatchEmbeddingRequest.model_validate_json(request_bytes)
+
+    def encode_pydantic():
+        # What FastAPI does for a returned model: validate against response_model, jsonable_encoder, json.dumps
+        response = PreviousBatchEmbeddingResponse(embeddings=vectors, model="model", embedding_size=dims)
+        validated = PreviousBatchEmbeddingResponse.model_validate(response.model_dump())
+        json.dumps(jsonable_encoder(validated), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    def encode_fast():
+        orjson.dumps(content)
+
+    body = orjson.dumps(content)
+    rows = [
+        {"stage": "decode_request", "baseline_ms": _timeit(decode_stdlib, repeat), "fast_ms": _timeit(decode_fast, repeat)},
+        {"stage": "encode_response", "baseline_ms": _timeit(encode_pydantic, repeat), "fast_ms": _timeit(encode_fast, repeat)},
+    ]
+    for row in rows:
+        row["speedup"] = round(row["baseline_ms"] / row["fast_ms"], 1)
+        row["baseline_ms"], row["fast_ms"] = round(row["baseline_ms"], 3), round(row["fast_ms"], 3)
+    for encoding in (["zstd"] if zstandard is not None else []) + ["gzip"]:
+        rows.append({
+            "stage": f"compress_{encoding}",
+            "ms": round(_timeit(lambda: compress(body, encoding), repeat), 3),
+            "bytes": len(compress(body, encoding)),
+            "uncompressed_bytes": len(body),
+        })
+    return rows
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark request/response serialization and compression.")
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+    for row in benchmark(args.texts, args.dims, args.repeat):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import httpx
 from google import genai
 from google.genai import types, errors
 from pydantic import BaseModel
-from .config import GEMINI_MODEL_NAME
+from .config import GEMINI_MODEL_NAME, GEMINI_CLASSIFY_CHUNK_SIZE, GEMINI_CLASSIFY_CHUNK_SIZE_NO_DEADLINE
+from .deadlines import CancellationToken
+from .profiling import trace_stage
 
 # Try to import GEMINI_API_KEY from config_secret.py
 try:
@@ -33,28 +36,75 @@ class GeminiClient:
             )
         self.client = genai.Client(api_key=self.api_key)
 
-    def classify_texts(self, texts: List[Dict[str, str]], topics: List[Dict[str, str]]) -> Dict[str, List[str]]:
+    def classify_texts(
+        self,
+        texts: List[Dict[str, str]],
+        topics: List[Dict[str, str]],
+        cancellation: Optional[CancellationToken] = None,
+    ) -> Dict[str, List[str]]:
         """
-        Sends a single structured prompt to Gemini for all texts and topics, returns mapping from text_id to topic_ids.
+        Classifies texts with structured prompts, returns mapping from text_id to topic_ids.
+        With a `cancellation` token, texts are sent in chunks (GEMINI_CLASSIFY_CHUNK_SIZE under a deadline,
+        GEMINI_CLASSIFY_CHUNK_SIZE_NO_DEADLINE otherwise) and the token is checked between calls: once it stops
+        (deadline or client disconnect), the remaining chunks are dropped and their texts are missing from the mapping.
+        Each call is also bounded by the time left before the deadline. Without a token all texts go in one prompt.
+        Every text of a processed chunk is in the mapping.
+        """
+        # Chunking repeats the topic prompt and costs one Gemini request per chunk, so chunks are smaller only when
+        # a deadline needs the finer granularity; a disconnect alone is served by the larger chunks
+        if cancellation is None:
+            chunk_size = max(len(texts), 1)
+        elif cancellation.deadline is not None:
+            chunk_size = GEMINI_CLASSIFY_CHUNK_SIZE
+        else:
+            chunk_size = GEMINI_CLASSIFY_CHUNK_SIZE_NO_DEADLINE
+        id_to_topic_ids: Dict[str, List[str]] = {}
+        for i in range(0, len(texts), chunk_size):
+            if cancellation and cancellation.should_stop():
+                break
+            chunk = texts[i:i + chunk_size]
+            timeout_ms = cancellation.remaining_ms() if cancellation else None
+            chunk_result = self._classify_chunk(chunk, topics, timeout_ms)
+            if chunk_result is None:
+                break  # Deadline hit during the call
+            for text in chunk:
+                id_to_topic_ids[text["id"]] = chunk_result.get(text["id"], [])
+        return id_to_topic_ids
+
+    def _classify_chunk(
+        self,
+        texts: List[Dict[str, str]],
+        topics: List[Dict[str, str]],
+        timeout_ms: Optional[float] = None,
+    ) -> Optional[Dict[str, List[str]]]:
+        """
+        Sends a single structured prompt to Gemini for the given texts and topics.
+        Returns None if the call timed out.
         """
         prompt = self._build_batch_prompt(texts, topics)
+        config = {
+            "response_mime_type": "application/json",
+            "response_schema": GeminiClassificationResponse,
+            "thinking_config": {
+                "thinking_budget": 0  # Disables the model's "thinking" step for faster, lower-cost responses.
+            },
+        }
+        if timeout_ms is not None:
+            config["http_options"] = {"timeout": max(1, int(timeout_ms))}
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config={
-                    "response_mime_type": "application/json",
-                    "response_schema": GeminiClassificationResponse,
-                    "thinking_config": {
-                        "thinking_budget": 0  # Disables the model's "thinking" step for faster, lower-cost responses.
-                    },
-                },
-            )
+            with trace_stage("gemini_call"):
+                response = self.client.models.generate_content(
+                    model=self.model_name,
+                    contents=prompt,
+                    config=config,
+                )
             # Use the parsed property for structured output
             parsed: GeminiClassificationResponse = response.parsed
             if not parsed or not parsed.results:
                 return {}
             return {r.text_id: r.topic_ids for r in parsed.results}
+        except httpx.TimeoutException:
+            return None
         except errors.APIError as e:
             # Log or handle API errors as needed
             return {}
@@ -0,0 +1,291 @@
+"""
+Local, versioned store of model artifacts so startup never depends on the HuggingFace hub.
+
+Layout:
+    <MODEL_STORE_DIR>/<model name with '/' -> '--'>/
+        CURRENT                  # revision in use
+        <revision>/
+            manifest.json        # sha256 and size of every file
+            config.json, model.safetensors, tokenizer files, ...
+
+Usage:
+    python -m src.model_store fetch                # fetch every model in EMBEDDING_ALLOWED_MODELS
+    python -m src.model_store fetch --model <name> [--revision <rev>]   # also installs its files from MODEL_ARTIFACTS_DIR
+    python -m src.model_store import --model <name> --from-dir <path>   # add an already downloaded model
+    python -m src.model_store verify               # re-hash every stored file against its manifest
+    python -m src.model_store install-artifacts    # add MODEL_ARTIFACTS_DIR files (e.g. pca.safetensors) to stored models
+    python -m src.model_store list
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from .config import EMBEDDING_ALLOWED_MODELS, MODEL_ARTIFACTS_DIR, MODEL_STORE_DIR
+
+# Only what is needed to load the model from safetensors; skips .bin/.onnx/... duplicates of the weights
+FETCH_ALLOW_PATTERNS = ["*.json", "*.safetensors", "*.txt", "*.model", "tokenizer*"]
+FETCH_IGNORE_PATTERNS = ["onnx/*", "openvino/*", "*.bin", "*.h5", "*.msgpack", "*.ot"]
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+class ModelStoreError(Exception):
+    """
+    Raised when a model is missing from the store or fails verification.
+    """
+
+class ManifestFile(BaseModel):
+    sha256: str
+    size: int
+
+class Manifest(BaseModel):
+    model_name: str
+    revision: str
+    created_at: float
+    files: Dict[str, ManifestFile]
+
+def model_dir(model_name: str, store_dir: str = MODEL_STORE_DIR) -> str:
+    return os.path.join(store_dir, model_name.replace("/", "--"))
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def current_revision(model_name: str, store_dir: str = MODEL_STORE_DIR) -> Optional[str]:
+    path = os.path.join(model_dir(model_name, store_dir), CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+def revision_dir(model_name: str, store_dir: str = MODEL_STORE_DIR) -> str:
+    """
+    Directory of the current revision. Raises ModelStoreError if the model is not in the store.
+    """
+    revision = current_revision(model_name, store_dir)
+    if revision is None:
+        raise ModelStoreError(f"Model '{model_name}' is not in the local model store '{store_dir}'.")
+    return os.path.join(model_dir(model_name, store_dir), revision)
+
+def has_model(model_name: str, store_dir: str = MODEL_STORE_DIR) -> bool:
+    return current_revision(model_name, store_dir) is not None
+
+def read_manifest(model_name: str, store_dir: str = MODEL_STORE_DIR) -> Manifest:
+    path = os.path.join(revision_dir(model_name, store_dir), MANIFEST_FILE)
+    try:
+        with open(path) as f:
+            return Manifest.model_validate_json(f.read())
+    except (OSError, ValueError) as e:
+        raise ModelStoreError(f"Unreadable manifest for '{model_name}': {e}")
+
+def verify(model_name: str, store_dir: str = MODEL_STORE_DIR, check_hashes: bool = True) -> Manifest:
+    """
+    Check every manifest entry exists with the recorded size (and sha256 if check_hashes).
+    Raises ModelStoreError on the first mismatch.
+    """
+    manifest = read_manifest(model_name, store_dir)
+    base = revision_dir(model_name, store_dir)
+    for rel_path, entry in manifest.files.items():
+        path = os.path.join(base, rel_path)
+        if not os.path.isfile(path) or os.path.getsize(path) != entry.size:
+            raise ModelStoreError(f"'{model_name}': {rel_path} is missing or has the wrong size.")
+        if check_hashes and _sha256(path) != entry.sha256:
+            raise ModelStoreError(f"'{model_name}': {rel_path} does not match its sha256.")
+    return manifest
+
+def add_model(model_name: str, source_dir: str, revision: str, store_dir: str = MODEL_STORE_DIR) -> Manifest:
+    """
+    Copy a downloaded model into the store as `revision`, write its manifest and make it current.
+    The revision directory is assembled under a temporary name and renamed, so readers never see a partial copy.
+    Re-adding an existing revision keeps the files its manifest recorded that the source does not provide
+    (artifacts added later, e.g. a fitted PCA projection).
+    """
+    files = {}
+    for root, dirs, names in os.walk(source_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]  # e.g. .cache/huggingface left by snapshot_download
+        for name in names:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, source_dir)] = path
+    if not any(p.endswith(".safetensors") for p in files):
+        raise ModelStoreError(f"'{model_name}' has no safetensors weights; the store only serves memory-mapped safetensors.")
+    base = model_dir(model_name, store_dir)
+    os.makedirs(base, exist_ok=True)
+    target = os.path.join(base, revision)
+    previous_manifest = os.path.join(target, MANIFEST_FILE)
+    if os.path.exists(previous_manifest):
+        try:
+            with open(previous_manifest) as f:
+                previous = Manifest.model_validate_json(f.read())
+        except (OSError, ValueError):
+            previous = None
+        for rel_path in (previous.files if previous else {}):
+            path = os.path.join(target, rel_path)
+            if rel_path not in files and os.path.isfile(path):
+                files[rel_path] = path
+    staging = tempfile.mkdtemp(prefix=f".{revision}-", dir=base)
+    try:
+        entries = {}
+        for rel_path, path in sorted(files.items()):
+            dest = os.path.join(staging, rel_path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copyfile(path, dest)
+            entries[rel_path] = ManifestFile(sha256=_sha256(dest), size=os.path.getsize(dest))
+        manifest = Manifest(model_name=model_name, revision=revision, created_at=time.time(), files=entries)
+        with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+            f.write(manifest.model_dump_json(indent=2))
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    tmp_current = os.path.join(base, f".{CURRENT_FILE}.tmp")
+    with open(tmp_current, "w") as f:
+        f.write(revision)
+    os.replace(tmp_current, os.path.join(base, CURRENT_FILE))
+    return manifest
+
+def add_artifact(model_name: str, rel_path: str, store_dir: str = MODEL_STORE_DIR) -> Manifest:
+    """
+    Record a file written into the current revision after the fact (e.g. a fitted PCA projection) in its manifest.
+    """
+    manifest = read_manifest(model_name, store_dir)
+    base = revision_dir(model_name, store_dir)
+    path = os.path.join(base, rel_path)
+    manifest.files[rel_path] = ManifestFile(sha256=_sha256(path), size=os.path.getsize(path))
+    tmp_path = os.path.join(base, f".{MANIFEST_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(manifest.model_dump_json(indent=2))
+    os.replace(tmp_path, os.path.join(base, MANIFEST_FILE))
+    return manifest
+
+def install_artifacts(
+    model_name: str,
+    artifacts_dir: str = MODEL_ARTIFACTS_DIR,
+    store_dir: str = MODEL_STORE_DIR,
+) -> List[str]:
+    """
+    Copy the model's files from `artifacts_dir` into its current revision and record them in the manifest.
+    Returns the installed relative paths (none if the model has no artifacts directory).
+    """
+    source = model_dir(model_name, artifacts_dir)
+    if not os.path.isdir(source):
+        return []
+    base = revision_dir(model_name, store_dir)
+    installed = []
+    for name in sorted(os.listdir(source)):
+        path = os.path.join(source, name)
+        if name.startswith(".") or not os.path.isfile(path):
+            continue
+        tmp_path = os.path.join(base, f".{name}.tmp")
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, os.path.join(base, name))
+        add_artifact(model_name, name, store_dir)
+        installed.append(name)
+    return installed
+
+def export_artifact(model_name: str, rel_path: str, artifacts_dir: str = MODEL_ARTIFACTS_DIR, store_dir: str = MODEL_STORE_DIR) -> str:
+    """
+    Copy a file of the model's current revision to `artifacts_dir`, where fetch and install-artifacts pick it up.
+    """
+    target_dir = model_dir(model_name, artifacts_dir)
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, os.path.basename(rel_path))
+    shutil.copyfile(os.path.join(revision_dir(model_name, store_dir), rel_path), target)
+    return target
+
+def fetch(model_name: str, revision: Optional[str] = None, store_dir: str = MODEL_STORE_DIR) -> Manifest:
+    """
+    Download the model from the HuggingFace hub at a pinned commit and add it to the store.
+    """
+    from huggingface_hub import HfApi, snapshot_download
+
+    commit = HfApi().model_info(model_name, revision=revision).sha
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_download(
+            model_name,
+            revision=commit,
+            local_dir=tmp_dir,
+            allow_patterns=FETCH_ALLOW_PATTERNS,
+            ignore_patterns=FETCH_IGNORE_PATTERNS,
+        )
+        return add_model(model_name, tmp_dir, commit, store_dir)
+
+def load_from_store(model_name: str, store_dir: str = MODEL_STORE_DIR) -> Tuple[object, object]:
+    """
+    Load tokenizer and model from the store without any network access.
+    Sizes are checked against the manifest (hashes are checked by `verify`); weights are read from
+    memory-mapped safetensors straight into the parameters instead of through an intermediate state dict copy.
+    """
+    from transformers import AutoTokenizer, AutoModel
+
+    verify(model_name, store_dir, check_hashes=False)
+    path = revision_dir(model_name, store_dir)
+    tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+    model = AutoModel.from_pretrained(path, local_files_only=True, use_safetensors=True, low_cpu_mem_usage=True)
+    model.eval()
+    return tokenizer, model
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage the local model artifact store.")
+    parser.add_argument("--store-dir", default=MODEL_STORE_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    fetch_parser = subparsers.add_parser("fetch", help="Download models from the hub into the store.")
+    fetch_parser.add_argument("--model", action="append", help="Model to fetch (repeatable). Defaults to EMBEDDING_ALLOWED_MODELS.")
+    fetch_parser.add_argument("--revision", help="Branch, tag or commit to pin (default: main).")
+    import_parser = subparsers.add_parser("import", help="Add an already downloaded model directory to the store.")
+    import_parser.add_argument("--model", required=True)
+    import_parser.add_argument("--from-dir", required=True)
+    import_parser.add_argument("--revision", default="local")
+    verify_parser = subparsers.add_parser("verify", help="Re-hash stored files against their manifests.")
+    verify_parser.add_argument("--model", action="append")
+    install_parser = subparsers.add_parser("install-artifacts", help="Add files from the artifacts directory to stored models.")
+    install_parser.add_argument("--model", action="append")
+    install_parser.add_argument("--from-dir", default=MODEL_ARTIFACTS_DIR)
+    subparsers.add_parser("list", help="List stored models and their current revision.")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        manifest = add_model(args.model, args.from_dir, args.revision, args.store_dir)
+        print(f"{manifest.model_name}@{manifest.revision}: {len(manifest.files)} files")
+        return
+    if args.command == "list":
+        if os.path.isdir(args.store_dir):
+            for name in sorted(os.listdir(args.store_dir)):
+                model_name = name.replace("--", "/")
+                try:
+                    manifest = read_manifest(model_name, args.store_dir)
+                except ModelStoreError:
+                    continue
+                print(f"{manifest.model_name}@{manifest.revision}")
+        return
+    model_names = args.model or EMBEDDING_ALLOWED_MODELS
+    failed = False
+    for model_name in model_names:
+        try:
+            if args.command == "fetch":
+                manifest = fetch(model_name, args.revision, args.store_dir)
+            if args.command in ("fetch", "install-artifacts"):
+                artifacts_dir = getattr(args, "from_dir", MODEL_ARTIFACTS_DIR)
+                for name in install_artifacts(model_name, artifacts_dir, args.store_dir):
+                    print(f"Installed {name} for {model_name}")
+            manifest = verify(model_name, args.store_dir)
+            total = sum(f.size for f in manifest.files.values())
+            print(f"OK {model_name}@{manifest.revision}: {len(manifest.files)} files, {total} bytes")
+        except ModelStoreError as e:
+            failed = True
+            print(f"FAILED {e}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from .config import SLOW_REQUEST_THRESHOLD_MS, SLOW_TRACE_BUFFER_SIZE, PROFILER_SAMPLE_INTERVAL_MS
+
+class RequestTrace:
+    """
+    Per-request timing breakdown. Stages are accumulated in milliseconds,
+    so a stage entered several times (e.g. one forward pass per micro-batch) is summed.
+    """
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.total_ms: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + elapsed_ms
+
+    def finish(self, status_code: Optional[int]) -> None:
+        self.total_ms = (time.perf_counter() - self._start) * 1000
+        self.status_code = status_code
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages = {name: round(ms, 3) for name, ms in self.stages.items()}
+        # Time not covered by an instrumented stage: routing, reading the body, middlewares, queueing
+        other_ms = (self.total_ms or 0.0) - sum(self.stages.values())
+        return {
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "status_code": self.status_code,
+            "total_ms": round(self.total_ms or 0.0, 3),
+            "stages": stages,
+            "other_ms": round(max(other_ms, 0.0), 3),
+        }
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+@contextmanager
+def trace_stage(name: str) -> Iterator[None]:
+    """
+    Time the enclosed block as `name` on the current request trace (no-op outside a request).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, (time.perf_counter() - start) * 1000)
+
+class SlowTraceBuffer:
+    """
+    Thread-safe ring buffer keeping the last N slow request traces.
+    """
+    def __init__(self, maxlen: int = SLOW_TRACE_BUFFER_SIZE):
+        self._traces: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, trace: RequestTrace) -> None:
+        with self._lock:
+            self._traces.append(trace.to_dict())
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._traces)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+slow_traces = SlowTraceBuffer()
+
+class SlowRequestTraceMiddleware:
+    """
+    ASGI middleware that attaches a RequestTrace to every HTTP request and
+    stores it in the slow trace buffer when the request exceeds the threshold.
+    """
+    def __init__(self, app, threshold_ms: float = SLOW_REQUEST_THRESHOLD_MS, buffer: SlowTraceBuffer = slow_traces):
+        self.app = app
+        self.threshold_ms = threshold_ms
+        self.buffer = buffer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = RequestTrace(scope.get("method", ""), scope.get("path", ""))
+        status = {"code": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            trace.finish(status["code"])
+            if trace.total_ms >= self.threshold_ms:
+                self.buffer.add(trace)
+
+def _frame_stack(frame) -> List[str]:
+    """
+    Outermost-first list of 'function (file:line)' entries, without reading source files.
+    """
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples the Python stacks of all threads at a fixed interval.
+    Unlike cProfile it sees the worker threads serving requests and its overhead does not grow with call volume,
+    so it is safe to run against a loaded server. Only one profiling session may run at a time.
+    """
+    _session_lock = threading.Lock()
+
+    def __init__(self, interval_ms: float = PROFILER_SAMPLE_INTERVAL_MS):
+        self.interval_s = interval_ms / 1000
+
+    def run(self, seconds: float, top: int = 30) -> Dict[str, Any]:
+        """
+        Sample for `seconds` and return the hottest functions (self and cumulative) and stacks.
+        Raises RuntimeError if another session is already running.
+        """
+        if not self._session_lock.acquire(blocking=False):
+            raise RuntimeError("A profiling session is already running.")
+        try:
+            own_ident = threading.get_ident()
+            self_counts: Counter = Counter()
+            cumulative_counts: Counter = Counter()
+            stack_counts: Counter = Counter()
+            samples = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    stack = _frame_stack(frame)
+                    if not stack:
+                        continue
+                    samples += 1
+                    self_counts[stack[-1]] += 1
+                    for entry in set(stack):
+                        cumulative_counts[entry] += 1
+                    stack_counts[";".join(stack)] += 1
+                time.sleep(self.interval_s)
+            return {
+                "mode": "sampling",
+                "seconds": seconds,
+                "samples": samples,
+                "self": [{"function": f, "samples": n} for f, n in self_counts.most_common(top)],
+                "cumulative": [{"function": f, "samples": n} for f, n in cumulative_counts.most_common(top)],
+                "stacks": [{"stack": s, "samples": n} for s, n in stack_counts.most_common(top)],
+            }
+        finally:
+            self._session_lock.release()
+
+class TorchOpProfiler:
+    """
+    Collects torch operator timings from the threads serving requests.
+    torch.profiler only records operators run on the thread that started it (and the admin request's thread just waits),
+    so while a session is active each forward pass wrapped in record() is profiled on its own thread and the operator
+    statistics are merged. Concurrent profilers interfere with each other, so forward passes overlapping one that is
+    already being profiled run unprofiled and are counted as skipped.
+    """
+    def __init__(self):
+        self.active = False
+        self._forward_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, List[float]] = {}  # op -> [calls, self CPU us, total CPU us]
+        self._profiled = 0
+        self._skipped = 0
+
+    @contextmanager
+    def record(self) -> Iterator[None]:
+        """
+        Profile the enclosed block on the current thread if a session is active (no-op otherwise).
+        """
+        if not self.active:
+            yield
+            return
+        if not self._forward_lock.acquire(blocking=False):
+            with self._stats_lock:
+                self._skipped += 1
+            yield
+            return
+        try:
+            import torch
+
+            with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU]) as prof:
+                yield
+            averages = prof.key_averages()
+            with self._stats_lock:
+                self._profiled += 1
+                for event in averages:
+                    stats = self._stats.setdefault(event.key, [0, 0.0, 0.0])
+                    stats[0] += event.count
+                    stats[1] += event.self_cpu_time_total
+                    stats[2] += event.cpu_time_total
+        finally:
+            self._forward_lock.release()
+
+    def run(self, seconds: float, top: int = 30) -> Dict[str, Any]:
+        """
+        Collect for `seconds` and return the operators with the highest self CPU time.
+        Shares the single-session lock with SamplingProfiler; raises RuntimeError if another session is running.
+        """
+        if not SamplingProfiler._session_lock.acquire(blocking=False):
+            raise RuntimeError("A profiling session is already running.")
+        try:
+            with self._stats_lock:
+                self._stats, self._profiled, self._skipped = {}, 0, 0
+            self.active = True
+            time.sleep(seconds)
+            self.active = False
+            with self._forward_lock:  # Let a forward pass still being profiled finish and merge
+                pass
+            with self._stats_lock:
+                ops = sorted(self._stats.items(), key=lambda item: item[1][1], reverse=True)[:top]
+                return {
+                    "mode": "torch",
+                    "seconds": seconds,
+                    "profiled_forward_passes": self._profiled,
+                    "skipped_forward_passes": self._skipped,
+                    "ops": [
+                        {"name": name, "calls": int(calls), "self_cpu_ms": round(self_us / 1000, 3), "cpu_ms": round(total_us / 1000, 3)}
+                        for name, (calls, self_us, total_us) in ops
+                    ],
+                }
+        finally:
+            self.active = False
+            SamplingProfiler._session_lock.release()
+
+torch_op_profiler = TorchOpProfiler()
+
+def record_torch_ops():
+    """
+    Wrap a forward pass so a `mode=torch` profiling session can record its operators.
+    """
+    return torch_op_profiler.record()
+
+def run_torch_profiler(seconds: float, top: int = 30) -> Dict[str, Any]:
+    """
+    Record torch operator timings of the forward passes run by request threads for `seconds`.
+    """
+    return torch_op_profiler.run(seconds, top=top)
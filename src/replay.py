@@ -0,0 +1,242 @@
+"""
+Offline replay of captured traffic against classifier backends and embedding engines.
+
+Usage:
+    python -m src.replay captures/ --target classify:RECORDED --target classify:MOCK
+    python -m src.replay captures/capture-*.jsonl --target embed:RECORDED --target embed:<model_name> --speed 4
+
+Targets (the first one is the baseline for agreement):
+    classify:RECORDED              responses recorded in the capture (stubs Gemini, runs offline)
+    classify:<PROVIDER>[:<model>]  a TextClassifierBackend from get_classifier_backend
+    embed:RECORDED                 embeddings recorded in the capture
+    embed:<model_name>             the API's embedding engine with that model
+
+--speed 1 replays at the recorded pace, N > 1 accelerates it, 0 (default) sends requests back to back.
+The report lists latency percentiles per target and, per target, agreement with the baseline:
+mean topic-set Jaccard for classification, mean/min cosine similarity for embeddings. Records a target failed on
+are counted under `errors`; records whose embeddings have different dimensions than the baseline's under `skipped`.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from .classifier_backends import RateLimiter, TextClassifierBackend, get_classifier_backend
+from .classifier_models import ClassificationResult, TextItem, TopicItem
+from .compaction import decode_embedding
+
+CLASSIFY_ENDPOINT = "/classify-texts"
+EMBEDDING_ENDPOINTS = ("/embeddings", "/batch-embeddings")
+
+class NoRateLimiter(RateLimiter):
+    """
+    Replays must not be throttled by the production per-minute/per-day limits.
+    """
+    def check_limit(self, key: str) -> Optional[str]:
+        return None
+
+def _classify_key(texts: List[Dict[str, str]], topics: List[Dict[str, str]]) -> str:
+    return json.dumps([texts, topics], sort_keys=True)
+
+class RecordedTextClassifier(TextClassifierBackend):
+    """
+    Backend answering from captured /classify-texts responses, so the Gemini leg of a comparison runs offline.
+    """
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.responses: Dict[str, Dict[str, List[str]]] = {}
+        for record in records:
+            if record["endpoint"] != CLASSIFY_ENDPOINT:
+                continue
+            request = record["request"]
+            key = _classify_key(request["texts"], request["topics"])
+            self.responses[key] = {r["text_id"]: r["topic_ids"] for r in record["response"]["results"]}
+
+    def classify(self, texts: List[TextItem], topics: List[TopicItem], cancellation=None) -> List[ClassificationResult]:
+        key = _classify_key([t.model_dump() for t in texts], [t.model_dump() for t in topics])
+        if key not in self.responses:
+            raise KeyError("No captured /classify-texts response for these texts and topics")
+        recorded = self.responses[key]
+        return [ClassificationResult(text_id=t.id, topic_ids=recorded.get(t.id, [])) for t in texts]
+
+def load_records(paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    Successful captured requests from JSONL files (directories are expanded), in timestamp order.
+    """
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl"))))
+        else:
+            files.append(path)
+    records = []
+    for file in files:
+        with open(file) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get("status_code") == 200 and record.get("request") and record.get("response"):
+                    records.append(record)
+    records.sort(key=lambda r: r["timestamp"])
+    return records
+
+def _embedding_texts(record: Dict[str, Any]) -> List[str]:
+    request = record["request"]
+    return [request["text"]] if record["endpoint"] == "/embeddings" else request["texts"]
+
+def _recorded_embeddings(record: Dict[str, Any]) -> List[List[float]]:
+    response = record["response"]
+    dtype = response.get("dtype", "float32")
+    if record["endpoint"] == "/embeddings":
+        return [decode_embedding(response["embeddings"], dtype, response.get("scale"))]
+    scales = response.get("scales") or [None] * len(response["embeddings"])
+    return [decode_embedding(e, dtype, s) for e, s in zip(response["embeddings"], scales)]
+
+def make_target(spec: str, records: List[Dict[str, Any]]) -> Tuple[str, Callable[[Dict[str, Any]], Any]]:
+    """
+    Build (endpoint kind, function record -> output) for a target spec.
+    Classification outputs are {text_id: set(topic_ids)}; embedding outputs are lists of float vectors.
+    """
+    kind, _, name = spec.partition(":")
+    if kind == "classify":
+        if name.upper() == "RECORDED":
+            backend: TextClassifierBackend = RecordedTextClassifier(records)
+        else:
+            provider, _, model_name = name.partition(":")
+            backend = get_classifier_backend(provider=provider, model_name=model_name or None, rate_limiter=NoRateLimiter())
+
+        def classify(record: Dict[str, Any]) -> Dict[str, set]:
+            request = record["request"]
+            texts = [TextItem(**t) for t in request["texts"]]
+            topics = [TopicItem(**t) for t in request["topics"]]
+            return {r.text_id: set(r.topic_ids) for r in backend.classify(texts, topics)}
+        return "classify", classify
+    if kind == "embed":
+        if name.upper() == "RECORDED":
+            return "embed", _recorded_embeddings
+
+        def embed(record: Dict[str, Any]) -> List[List[float]]:
+            from main import encode_texts  # Same engine as the API
+            return encode_texts(_embedding_texts(record), name).tolist()
+        return "embed", embed
+    raise ValueError(f"Invalid target '{spec}'. Use classify:<PROVIDER>[:<model>], classify:RECORDED, embed:<model> or embed:RECORDED.")
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+def agreement(kind: str, baseline: Any, output: Any) -> Optional[List[float]]:
+    """
+    Per-text agreement scores between two outputs for the same record, or None if they are not comparable.
+    """
+    if kind == "classify":
+        return [jaccard(topics, output.get(text_id, set())) for text_id, topics in baseline.items()]
+    if len(baseline) != len(output) or any(len(a) != len(b) for a, b in zip(baseline, output)):
+        return None  # Different dimensions (e.g. a compacted capture) are not comparable
+    return [cosine(a, b) for a, b in zip(baseline, output)]
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(math.ceil(q * len(ordered))) - 1))]
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(percentile(values, 0.50), 3),
+        "p90": round(percentile(values, 0.90), 3),
+        "p99": round(percentile(values, 0.99), 3),
+        "max": round(max(values), 3),
+    }
+
+def _paced(records: List[Dict[str, Any]], speed: float) -> Iterator[Dict[str, Any]]:
+    if not records:
+        return
+    start_wall = time.perf_counter()
+    first_ts = records[0]["timestamp"]
+    for record in records:
+        if speed > 0:
+            delay = (record["timestamp"] - first_ts) / speed - (time.perf_counter() - start_wall)
+            if delay > 0:
+                time.sleep(delay)
+        yield record
+
+def replay(records: List[Dict[str, Any]], target_specs: List[str], speed: float = 0.0) -> Dict[str, Any]:
+    """
+    Replay records against every target and return the latency and agreement report.
+    """
+    targets = [(spec, *make_target(spec, records)) for spec in target_specs]
+    kinds = {kind for _, kind, _ in targets}
+    if len(kinds) != 1:
+        raise ValueError("All targets must be of the same kind (all classify:* or all embed:*).")
+    kind = kinds.pop()
+    endpoints = (CLASSIFY_ENDPOINT,) if kind == "classify" else EMBEDDING_ENDPOINTS
+    records = [r for r in records if r["endpoint"] in endpoints]
+    # Warm up (model loading, imports) so the first record does not skew the latency distribution
+    for _, _, run in (targets if records else []):
+        try:
+            run(records[0])
+        except Exception:
+            pass
+    latencies: Dict[str, List[float]] = {spec: [] for spec in target_specs}
+    scores: Dict[str, List[float]] = {spec: [] for spec in target_specs[1:]}
+    errors: Dict[str, int] = {spec: 0 for spec in target_specs}
+    skipped: Dict[str, int] = {spec: 0 for spec in target_specs[1:]}
+    for record in _paced(records, speed):
+        outputs = {}
+        for spec, _, run in targets:
+            start = time.perf_counter()
+            try:
+                outputs[spec] = run(record)
+            except Exception:
+                errors[spec] += 1
+                continue
+            latencies[spec].append((time.perf_counter() - start) * 1000)
+        baseline = outputs.get(target_specs[0])
+        if baseline is None:
+            continue
+        for spec in target_specs[1:]:
+            if spec not in outputs:
+                continue
+            record_scores = agreement(kind, baseline, outputs[spec])
+            if record_scores is None:
+                skipped[spec] += 1
+            else:
+                scores[spec].extend(record_scores)
+    report: Dict[str, Any] = {"records": len(records), "kind": kind, "baseline": target_specs[0], "targets": {}}
+    if records:
+        # End-to-end production latency, for reference (includes HTTP and queueing)
+        report["recorded_latency_ms"] = latency_summary([r["latency_ms"] for r in records])
+    for spec in target_specs:
+        entry: Dict[str, Any] = {"errors": errors[spec]}
+        if spec in skipped:
+            entry["skipped"] = skipped[spec]  # Records whose outputs could not be compared with the baseline
+        if latencies[spec]:
+            entry["latency_ms"] = latency_summary(latencies[spec])
+        if spec in scores and scores[spec]:
+            metric = "jaccard" if kind == "classify" else "cosine"
+            entry[metric] = {
+                "mean": round(sum(scores[spec]) / len(scores[spec]), 5),
+                "min": round(min(scores[spec]), 5),
+            }
+        report["targets"][spec] = entry
+    return report
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay captured traffic against backends and compare them.")
+    parser.add_argument("captures", nargs="+", help="Capture JSONL files or directories.")
+    parser.add_argument("--target", action="append", required=True, help="Target to replay against (repeatable); the first is the baseline.")
+    parser.add_argument("--speed", type=float, default=0.0, help="0: back to back, 1: recorded pace, N: N times faster.")
+    args = parser.parse_args(argv)
+    print(json.dumps(replay(load_records(args.captures), args.target, args.speed), indent=2))
+
+if __name__ == "__main__":
+    main()
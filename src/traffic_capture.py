@@ -0,0 +1,147 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from .config import (
+    TRAFFIC_CAPTURE_DIR,
+    TRAFFIC_CAPTURE_SAMPLE_RATE,
+    TRAFFIC_CAPTURE_PATHS,
+    TRAFFIC_CAPTURE_MAX_FILE_BYTES,
+    TRAFFIC_CAPTURE_MAX_FILES,
+    TRAFFIC_CAPTURE_QUEUE_SIZE,
+)
+
+class RotatingJsonlWriter:
+    """
+    Appends JSON records to capture-<timestamp>.jsonl files in a directory, starting a new file once
+    the current one exceeds max_bytes and deleting the oldest files beyond max_files.
+    """
+    def __init__(self, directory: str = TRAFFIC_CAPTURE_DIR, max_bytes: int = TRAFFIC_CAPTURE_MAX_FILE_BYTES, max_files: int = TRAFFIC_CAPTURE_MAX_FILES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._file = None
+        self._counter = 0
+
+    def _open_new_file(self) -> None:
+        if self._file:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._counter += 1
+        name = f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._counter:04d}.jsonl"
+        self._file = open(os.path.join(self.directory, name), "a")
+        files = sorted(f for f in os.listdir(self.directory) if f.startswith("capture-") and f.endswith(".jsonl"))
+        for old in files[:max(0, len(files) - self.max_files)]:
+            os.remove(os.path.join(self.directory, old))
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._file is None or self._file.tell() >= self.max_bytes:
+            self._open_new_file()
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+def _decode_json(body: bytes) -> Any:
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+class TrafficRecorder:
+    """
+    Hands captured records to a background writer thread through a bounded queue.
+    Records are dropped (and counted) when the queue is full, so capture never blocks request handling.
+    Bytes values (raw request/response bodies) are decoded as JSON on the writer thread, off the event loop.
+    """
+    def __init__(self, writer: Optional[RotatingJsonlWriter] = None, queue_size: int = TRAFFIC_CAPTURE_QUEUE_SIZE):
+        self.writer = writer or RotatingJsonlWriter()
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            self.writer.write({k: _decode_json(v) if isinstance(v, bytes) else v for k, v in record.items()})
+        self.writer.close()
+
+    def record(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """
+        Flush queued records and stop the writer thread.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+class TrafficCaptureMiddleware:
+    """
+    ASGI middleware that samples requests to the captured paths and records the request body,
+    response body, status and latency as one JSONL line. Only sampled requests are buffered.
+    """
+    def __init__(
+        self,
+        app,
+        recorder: Optional[TrafficRecorder] = None,
+        sample_rate: float = TRAFFIC_CAPTURE_SAMPLE_RATE,
+        paths: Optional[List[str]] = None,
+    ):
+        self.app = app
+        self.recorder = recorder or TrafficRecorder()
+        self.sample_rate = sample_rate
+        self.paths = set(paths if paths is not None else TRAFFIC_CAPTURE_PATHS)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") not in self.paths or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+        request_body: List[bytes] = []
+        response_body: List[bytes] = []
+        status = {"code": None}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.append(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            self.recorder.record({
+                "timestamp": started_at,
+                "endpoint": scope["path"],
+                "status_code": status["code"],
+                "latency_ms": (time.perf_counter() - start) * 1000,
+                "request": b"".join(request_body),  # Decoded by the recorder's writer thread
+                "response": b"".join(response_body),
+            })
@@ -0,0 +1,104 @@
+import threading
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from main import app
+from src.profiling import SlowRequestTraceMiddleware, SlowTraceBuffer, record_torch_ops, run_torch_profiler, trace_stage
+
+client = TestClient(app)
+
+ADMIN_TOKEN = "test-admin-token"
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", ADMIN_TOKEN)
+    return ADMIN_TOKEN
+
+class TestAdminAuth:
+    """Tests for the admin token protection"""
+
+    def test_disabled_without_token(self, monkeypatch):
+        monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+        response = client.get("/admin/slow-traces", headers={"X-Admin-Token": "anything"})
+        assert response.status_code == 404
+
+    def test_wrong_token(self, admin_token):
+        response = client.get("/admin/slow-traces", headers={"X-Admin-Token": "wrong"})
+        assert response.status_code == 403
+        response = client.get("/admin/slow-traces")
+        assert response.status_code == 403
+
+    def test_valid_token(self, admin_token):
+        response = client.get("/admin/slow-traces", headers={"X-Admin-Token": admin_token})
+        assert response.status_code == 200
+        assert "traces" in response.json()
+
+class TestProfiling:
+    """Tests for the on-demand profiler endpoint"""
+
+    def test_sampling_profile(self, admin_token):
+        response = client.post(
+            "/admin/profile",
+            params={"seconds": 0.2, "mode": "sampling"},
+            headers={"X-Admin-Token": admin_token},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["mode"] == "sampling"
+        assert data["samples"] > 0
+        assert data["self"] and data["cumulative"]
+
+    def test_torch_profile_records_request_threads(self):
+        torch = pytest.importorskip("torch")
+        a = torch.randn(64, 64)
+        result = {}
+        session = threading.Thread(target=lambda: result.update(run_torch_profiler(0.3)))
+        session.start()
+        while session.is_alive():
+            with record_torch_ops():
+                a @ a
+        session.join()
+        assert result["profiled_forward_passes"] > 0
+        assert any(op["name"] == "aten::mm" for op in result["ops"])
+
+    def test_invalid_mode_and_duration(self, admin_token):
+        headers = {"X-Admin-Token": admin_token}
+        assert client.post("/admin/profile", params={"seconds": 0.1, "mode": "bad"}, headers=headers).status_code == 400
+        assert client.post("/admin/profile", params={"seconds": 100000}, headers=headers).status_code == 422
+
+class TestSlowRequestTraces:
+    """Tests for slow request capture with per-stage timings"""
+
+    def test_slow_requests_are_captured_with_stages(self):
+        buffer = SlowTraceBuffer(maxlen=2)
+        traced_app = FastAPI()
+        traced_app.add_middleware(SlowRequestTraceMiddleware, threshold_ms=0, buffer=buffer)
+
+        @traced_app.get("/work")
+        def work():
+            with trace_stage("tokenize"):
+                pass
+            with trace_stage("forward"):
+                pass
+            with trace_stage("forward"):
+                pass
+            return {"ok": True}
+
+        traced_client = TestClient(traced_app)
+        for _ in range(3):
+            assert traced_client.get("/work").status_code == 200
+        traces = buffer.list()
+        assert len(traces) == 2  # Ring buffer keeps only the last N
+        trace = traces[-1]
+        assert trace["path"] == "/work"
+        assert trace["status_code"] == 200
+        assert set(trace["stages"]) == {"tokenize", "forward"}
+        assert trace["total_ms"] >= sum(trace["stages"].values())
+
+    def test_fast_requests_are_not_captured(self):
+        buffer = SlowTraceBuffer()
+        traced_app = FastAPI()
+        traced_app.add_middleware(SlowRequestTraceMiddleware, threshold_ms=60000, buffer=buffer)
+        traced_app.get("/fast")(lambda: {"ok": True})
+        assert TestClient(traced_app).get("/fast").status_code == 200
+        assert buffer.list() == []
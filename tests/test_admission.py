@@ -0,0 +1,137 @@
+import time
+import pytest
+import torch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import main
+from main import app
+from src.admission import AdaptiveConcurrencyLimiter, MicroBatchSizer, AdmissionController, admission_controller
+
+client = TestClient(app)
+
+TEXTS = [{"id": "t1", "text": "This is about sports."}]
+TOPICS = [{"id": "s", "topic": "sports"}]
+
+class TestAdaptiveConcurrencyLimiter:
+    """Tests for the AIMD concurrency limit"""
+
+    def test_rejects_when_limit_reached(self):
+        limiter = AdaptiveConcurrencyLimiter(latency_slo_ms=100, initial_limit=2)
+        assert limiter.try_acquire()
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+        limiter.release(10)
+        assert limiter.try_acquire()
+
+    def test_additive_increase_when_saturated_and_fast(self):
+        limiter = AdaptiveConcurrencyLimiter(latency_slo_ms=100, initial_limit=2, max_limit=3)
+        for _ in range(5):
+            assert limiter.try_acquire()
+            assert limiter.try_acquire()
+            limiter.release(10)
+            limiter.release(10)
+        assert limiter.limit == 3  # Capped at max_limit
+
+    def test_multiplicative_decrease_on_slo_miss(self):
+        limiter = AdaptiveConcurrencyLimiter(latency_slo_ms=100, initial_limit=10, backoff_ratio=0.5)
+        limiter.try_acquire()
+        limiter.release(500)
+        assert limiter.limit == 5
+        for _ in range(10):
+            limiter.try_acquire()
+            limiter.release(500)
+        assert limiter.limit == limiter.min_limit
+
+    def test_failure_counts_as_slo_miss(self):
+        limiter = AdaptiveConcurrencyLimiter(latency_slo_ms=100, initial_limit=10, backoff_ratio=0.5)
+        limiter.try_acquire()
+        limiter.release(1, success=False)
+        assert limiter.limit == 5
+
+class TestMicroBatchSizer:
+    """Tests for SLO-driven micro-batch sizing"""
+
+    def test_shrinks_on_slo_miss_and_recovers(self):
+        sizer = MicroBatchSizer(latency_slo_ms=100, min_size=1, max_size=16)
+        sizer.observe(500)
+        assert sizer.size == 8
+        sizer.observe(500)
+        sizer.observe(500)
+        sizer.observe(500)
+        sizer.observe(500)
+        assert sizer.size == 1
+        sizer.observe(10)
+        assert sizer.size == 2
+
+class TestAdmissionController:
+    """Tests for per endpoint/model admission and load shedding"""
+
+    def test_sheds_with_503_and_retry_after(self):
+        controller = AdmissionController(slo_ms={"/x": 100})
+        limiter = controller.get_limiter("/x", "m")
+        while limiter.try_acquire():
+            pass
+        with pytest.raises(HTTPException) as excinfo:
+            with controller.admit("/x", "m"):
+                pass
+        assert excinfo.value.status_code == 503
+        assert "Retry-After" in excinfo.value.headers
+        # Other models have their own limit
+        with controller.admit("/x", "other"):
+            pass
+
+    def test_client_errors_do_not_shrink_limit(self):
+        controller = AdmissionController(slo_ms={"/x": 100})
+        limit = controller.get_limiter("/x", "m").limit
+        with pytest.raises(HTTPException):
+            with controller.admit("/x", "m"):
+                raise HTTPException(status_code=400, detail="bad request")
+        assert controller.get_limiter("/x", "m").limit >= limit
+
+    def test_reported_latency_replaces_wall_time(self):
+        controller = AdmissionController(slo_ms={"/x": 100})
+        limit = controller.get_limiter("/x", "m").limit
+        with controller.admit("/x", "m") as admission:
+            time.sleep(0.15)  # A large request, longer than the SLO...
+            admission.latency_ms = 20  # ...whose per micro-batch latency meets it
+        assert controller.get_limiter("/x", "m").limit >= limit
+
+    def test_large_batch_does_not_shrink_limit(self, monkeypatch):
+        def encode(texts, model_name, pad_to_multiple_of=None):
+            time.sleep(0.01)
+            return torch.zeros(len(texts), 4)
+
+        monkeypatch.setattr(main, "encode_texts", encode)
+        monkeypatch.setattr(admission_controller, "get_batch_sizer", lambda *args, **kwargs: MicroBatchSizer(max_size=1))
+        monkeypatch.setitem(admission_controller.slo_ms, "/batch-embeddings", 50)
+        limiter = admission_controller.get_limiter("/batch-embeddings", main.UNKNOWN_MODEL_KEY)
+        limit = limiter.limit
+        # 10 micro-batches of ~10 ms: the request takes ~100 ms, over the 50 ms SLO
+        response = client.post("/batch-embeddings", json={"texts": ["a"] * 10, "model_name": "m"})
+        assert response.status_code == 200
+        assert limiter.limit >= limit
+
+    def test_classify_texts_returns_503_when_overloaded(self):
+        limiter = admission_controller.get_limiter("/classify-texts", "MOCK:None")
+        limiter._in_flight += limiter.limit
+        try:
+            response = client.post("/classify-texts", json={"texts": TEXTS, "topics": TOPICS})
+        finally:
+            limiter._in_flight -= limiter.limit
+        assert response.status_code == 503
+        assert response.headers["Retry-After"]
+
+    def test_unknown_models_share_one_limiter(self, monkeypatch):
+        monkeypatch.setattr(main, "get_text_embedding", lambda text, model_name: [0.0])
+        for i in range(3):
+            client.post("/embeddings", json={"text": "a", "model_name": f"bogus-{i}"})
+        keys = [key for key in admission_controller._limiters if key[0] == "/embeddings"]
+        assert not any(model.startswith("bogus-") for _, model in keys)
+        assert ("/embeddings", main.UNKNOWN_MODEL_KEY) in keys
+
+    def test_disallowed_model_rejected_before_admission(self, monkeypatch):
+        monkeypatch.setattr(main, "ENV", "production")
+        before = len(admission_controller._limiters)
+        response = client.post("/batch-embeddings", json={"texts": ["a"], "model_name": "not-allowed"})
+        assert response.status_code == 403
+        assert len(admission_controller._limiters) == before
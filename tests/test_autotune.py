@@ -0,0 +1,83 @@
+import pytest
+from src.autotune import (
+    profile_path,
+    BenchmarkResult,
+    build_profile,
+    load_profile,
+    save_profile,
+    select_best,
+    synthetic_texts,
+    thread_candidates,
+)
+
+def result(threads, batch, throughput, p95, interop=1, pad=None):
+    return BenchmarkResult(
+        num_threads=threads,
+        num_interop_threads=interop,
+        micro_batch_size=batch,
+        pad_to_multiple_of=pad,
+        throughput=throughput,
+        p95_latency_ms=p95,
+    )
+
+class TestSelection:
+    """Tests for choosing the best configuration under the latency cap"""
+
+    def test_best_throughput_under_cap(self):
+        results = [result(1, 1, 100, 10), result(1, 8, 300, 40), result(1, 32, 500, 900)]
+        best = select_best(results, latency_cap_ms=100)
+        assert best.micro_batch_size == 8
+
+    def test_lowest_latency_when_nothing_meets_cap(self):
+        results = [result(1, 8, 300, 400), result(1, 1, 100, 200)]
+        assert select_best(results, latency_cap_ms=100).micro_batch_size == 1
+
+    def test_empty_results(self):
+        with pytest.raises(ValueError):
+            select_best([])
+
+    def test_build_profile_picks_shared_threads(self):
+        results = {
+            "a": [result(1, 8, 100, 10), result(2, 8, 180, 10, pad=8)],
+            "b": [result(1, 4, 50, 10), result(2, 16, 90, 10)],
+        }
+        profile = build_profile(results, latency_cap_ms=100)
+        assert profile.num_threads == 2
+        assert profile.models["a"].micro_batch_size == 8
+        assert profile.models["a"].pad_to_multiple_of == 8
+        assert profile.models["b"].micro_batch_size == 16
+
+class TestPersistence:
+    """Tests for the per-host profile file"""
+
+    def test_save_and_load(self, tmp_path):
+        profile = build_profile({"a": [result(1, 8, 100, 10)]}, latency_cap_ms=100)
+        save_profile(profile, str(tmp_path))
+        loaded = load_profile(str(tmp_path))
+        assert loaded == profile
+
+    def test_profile_from_other_host_is_ignored(self, tmp_path):
+        profile = build_profile({"a": [result(1, 8, 100, 10)]}, latency_cap_ms=100)
+        profile.cpu_count += 1
+        save_profile(profile, str(tmp_path))
+        assert load_profile(str(tmp_path)) is None
+
+    def test_profile_reused_across_hostnames(self, tmp_path, monkeypatch):
+        profile = build_profile({"a": [result(1, 8, 100, 10)]}, latency_cap_ms=100)
+        save_profile(profile, str(tmp_path))
+        monkeypatch.setattr("platform.node", lambda: "another-container-id")
+        assert profile_path(str(tmp_path)).startswith(str(tmp_path))
+        assert load_profile(str(tmp_path)) == profile
+
+    def test_missing_or_corrupt_profile(self, tmp_path):
+        assert load_profile(str(tmp_path)) is None
+        profile = build_profile({"a": [result(1, 8, 100, 10)]}, latency_cap_ms=100)
+        path = save_profile(profile, str(tmp_path))
+        with open(path, "w") as f:
+            f.write("{not json")
+        assert load_profile(str(tmp_path)) is None
+
+def test_grid_inputs():
+    assert synthetic_texts(10) == synthetic_texts(10)
+    assert len(set(len(t.split()) for t in synthetic_texts(20))) > 1
+    assert thread_candidates()[0] == 1
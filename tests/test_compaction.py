@@ -0,0 +1,100 @@
+import json
+import pytest
+import torch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from main import app
+from src import compaction
+from src.compaction import (
+    EmbeddingOutputOptions,
+    compact_embeddings,
+    decode_embedding,
+    embedding_size,
+    fit_pca,
+)
+
+client = TestClient(app)
+
+MODEL = "test-model"
+
+@pytest.fixture
+def pooled():
+    torch.manual_seed(0)
+    return torch.randn(4, 64)
+
+def cosine(a, b):
+    a, b = torch.tensor(a), torch.tensor(b)
+    return torch.nn.functional.cosine_similarity(a, b, dim=0).item()
+
+class TestCompaction:
+    """Tests for normalization, dimension reduction and quantization of embeddings"""
+
+    def test_default_options_are_unchanged(self, pooled):
+        out = compact_embeddings(pooled, EmbeddingOutputOptions(), MODEL)
+        assert [e.data for e in out] == pooled.tolist()
+        assert all(e.scale is None for e in out)
+
+    def test_truncate_and_normalize(self, pooled):
+        out = compact_embeddings(pooled, EmbeddingOutputOptions(dimensions=16, normalize=True), MODEL)
+        for e, row in zip(out, pooled):
+            assert len(e.data) == 16
+            assert torch.tensor(e.data).norm().item() == pytest.approx(1.0, abs=1e-5)
+            assert cosine(e.data, row[:16].tolist()) == pytest.approx(1.0, abs=1e-5)
+
+    def test_dimensions_too_large(self, pooled):
+        with pytest.raises(HTTPException) as excinfo:
+            compact_embeddings(pooled, EmbeddingOutputOptions(dimensions=65), MODEL)
+        assert excinfo.value.status_code == 400
+
+    @pytest.mark.parametrize("encoding_format", ["float", "base64"])
+    def test_int8_round_trip(self, pooled, encoding_format):
+        out = compact_embeddings(pooled, EmbeddingOutputOptions(dtype="int8", encoding_format=encoding_format), MODEL)
+        for e, row in zip(out, pooled):
+            if encoding_format == "float":
+                assert all(isinstance(v, int) and -127 <= v <= 127 for v in e.data)
+            assert embedding_size(e.data, "int8") == 64
+            decoded = decode_embedding(e.data, "int8", e.scale)
+            assert cosine(decoded, row.tolist()) > 0.999
+
+    def test_float16_base64_round_trip(self, pooled):
+        out = compact_embeddings(pooled, EmbeddingOutputOptions(dtype="float16", encoding_format="base64"), MODEL)
+        for e, row in zip(out, pooled):
+            assert isinstance(e.data, str)
+            assert embedding_size(e.data, "float16") == 64
+            decoded = decode_embedding(e.data, "float16")
+            assert decoded == pytest.approx(row.tolist(), rel=1e-2, abs=1e-3)
+
+    def test_float16_json_uses_shortest_decimals(self, pooled):
+        out = compact_embeddings(pooled, EmbeddingOutputOptions(dtype="float16"), MODEL)
+        for e, row in zip(out, pooled):
+            # Each number parses back to exactly the float16 value, with no longer representation
+            assert torch.tensor(e.data).half().tolist() == row.half().tolist()
+            assert all(len(repr(v)) <= len(repr(h)) for v, h in zip(e.data, row.half().tolist()))
+        full = json.dumps([e.data for e in compact_embeddings(pooled, EmbeddingOutputOptions(), MODEL)])
+        assert len(json.dumps([e.data for e in out])) * 2 < len(full)
+
+    def test_pca_projection(self, pooled, monkeypatch):
+        # Low-rank data: 8 PCA components preserve the cosine structure
+        torch.manual_seed(1)
+        data = torch.randn(200, 8) @ torch.randn(8, 64)
+        projection = fit_pca(data)
+        monkeypatch.setattr(compaction, "load_pca_projection", lambda model_name: projection)
+        out = compact_embeddings(data[:4], EmbeddingOutputOptions(dimensions=8, projection="pca"), MODEL)
+        full = torch.nn.functional.normalize(data[:4], dim=1)
+        reduced = torch.nn.functional.normalize(torch.tensor([e.data for e in out]), dim=1)
+        assert torch.allclose(full @ full.T, reduced @ reduced.T, atol=1e-4)
+        with pytest.raises(HTTPException):
+            compact_embeddings(data[:4], EmbeddingOutputOptions(dimensions=65, projection="pca"), MODEL)
+
+    def test_pca_missing_projection(self, pooled):
+        with pytest.raises(HTTPException) as excinfo:
+            compact_embeddings(pooled, EmbeddingOutputOptions(dimensions=8, projection="pca"), "model-not-in-store")
+        assert excinfo.value.status_code == 400
+
+def test_invalid_options_rejected():
+    """Invalid output options should return 422 before any model is loaded"""
+    for options in ({"dtype": "int4"}, {"encoding_format": "hex"}, {"dimensions": 0}, {"projection": "random"}):
+        response = client.post("/embeddings", json={"text": "x", "model_name": MODEL, **options})
+        assert response.status_code == 422
+        response = client.post("/batch-embeddings", json={"texts": ["x"], "model_name": MODEL, **options})
+        assert response.status_code == 422
@@ -0,0 +1,179 @@
+import asyncio
+import time
+import pytest
+import torch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import main
+from main import app
+from src.admission import MicroBatchSizer
+from src.compaction import EmbeddingOutputOptions
+from src.classifier_backends import InMemoryRateLimiter, get_classifier_backend
+from src.classifier_models import TextItem, TopicItem
+from src.config import MAX_REQUEST_TIMEOUT_MS
+from src.deadlines import CancellationToken, resolve_timeout_ms, run_cancellable
+from src.gemini_client import GeminiClient
+
+client = TestClient(app)
+
+TEXTS = [{"id": f"t{i}", "text": f"Text {i} about sports."} for i in range(5)]
+TOPICS = [{"id": "s", "topic": "sports"}]
+
+class TestCancellationToken:
+    """Tests for deadline and cancellation tracking"""
+
+    def test_no_deadline(self):
+        token = CancellationToken()
+        assert not token.should_stop()
+        assert token.remaining_ms() is None
+        token.cancel()
+        assert token.cancelled and token.should_stop()
+
+    def test_deadline_expires(self):
+        token = CancellationToken(timeout_ms=10)
+        assert 0 < token.remaining_ms() <= 10
+        time.sleep(0.02)
+        assert token.expired and token.should_stop()
+        assert token.remaining_ms() == 0
+
+class TestResolveTimeout:
+    """Tests for reading the deadline from the body field or header"""
+
+    def test_field_overrides_header(self):
+        assert resolve_timeout_ms(500, "1000") == 500
+        assert resolve_timeout_ms(None, "1000") == 1000
+        assert resolve_timeout_ms(None, None) is None
+
+    def test_capped(self):
+        assert resolve_timeout_ms(MAX_REQUEST_TIMEOUT_MS * 10, None) == MAX_REQUEST_TIMEOUT_MS
+
+    @pytest.mark.parametrize("header", ["abc", "0", "-5"])
+    def test_invalid_header(self, header):
+        with pytest.raises(HTTPException) as excinfo:
+            resolve_timeout_ms(None, header)
+        assert excinfo.value.status_code == 400
+
+class TestPartialResults:
+    """Tests for dropping outstanding work when the token stops"""
+
+    def test_mock_backend_stops_early(self):
+        backend = get_classifier_backend(provider="MOCK", rate_limiter=InMemoryRateLimiter(per_minute=100))
+        token = CancellationToken()
+        token.cancel()
+        texts = [TextItem(**t) for t in TEXTS]
+        topics = [TopicItem(**t) for t in TOPICS]
+        assert backend.classify(texts, topics, cancellation=token) == []
+        assert len(backend.classify(texts, topics, cancellation=CancellationToken(timeout_ms=60000))) == len(TEXTS)
+
+    def test_gemini_drops_outstanding_chunks(self, monkeypatch):
+        monkeypatch.setattr("src.gemini_client.GEMINI_CLASSIFY_CHUNK_SIZE", 2)
+        gemini = GeminiClient.__new__(GeminiClient)  # Skip the API key / network client setup
+        token = CancellationToken(timeout_ms=60000)
+        calls = []
+
+        def fake_chunk(texts, topics, timeout_ms=None):
+            calls.append([t["id"] for t in texts])
+            token.cancel()  # Client goes away during the first call
+            return {texts[0]["id"]: ["s"]}
+
+        monkeypatch.setattr(gemini, "_classify_chunk", fake_chunk)
+        mapping = gemini.classify_texts([{"id": t["id"], "text": t["text"]} for t in TEXTS], TOPICS, cancellation=token)
+        assert calls == [["t0", "t1"]]
+        assert mapping == {"t0": ["s"], "t1": []}
+
+    def test_gemini_without_deadline_uses_larger_chunks(self, monkeypatch):
+        monkeypatch.setattr("src.gemini_client.GEMINI_CLASSIFY_CHUNK_SIZE", 2)
+        monkeypatch.setattr("src.gemini_client.GEMINI_CLASSIFY_CHUNK_SIZE_NO_DEADLINE", 3)
+        gemini = GeminiClient.__new__(GeminiClient)
+        calls = []
+        monkeypatch.setattr(gemini, "_classify_chunk", lambda texts, topics, timeout_ms=None: calls.append(len(texts)) or {})
+        texts = [{"id": t["id"], "text": t["text"]} for t in TEXTS]
+        mapping = gemini.classify_texts(texts, TOPICS, cancellation=CancellationToken())
+        assert calls == [3, 2]
+        assert set(mapping) == {t["id"] for t in TEXTS}
+        calls.clear()
+        gemini.classify_texts(texts, TOPICS)
+        assert calls == [len(TEXTS)]
+
+    def test_gemini_disconnect_without_deadline_drops_chunks(self, monkeypatch):
+        monkeypatch.setattr("src.gemini_client.GEMINI_CLASSIFY_CHUNK_SIZE_NO_DEADLINE", 2)
+        gemini = GeminiClient.__new__(GeminiClient)
+        token = CancellationToken()
+        calls = []
+
+        def fake_chunk(texts, topics, timeout_ms=None):
+            calls.append(len(texts))
+            token.cancel()  # Client navigates away during the first call
+            return {}
+
+        monkeypatch.setattr(gemini, "_classify_chunk", fake_chunk)
+        gemini.classify_texts([{"id": t["id"], "text": t["text"]} for t in TEXTS], TOPICS, cancellation=token)
+        assert calls == [2]
+
+    def test_gemini_timed_out_chunk_is_not_reported(self, monkeypatch):
+        monkeypatch.setattr("src.gemini_client.GEMINI_CLASSIFY_CHUNK_SIZE", 2)
+        gemini = GeminiClient.__new__(GeminiClient)
+        monkeypatch.setattr(gemini, "_classify_chunk", lambda texts, topics, timeout_ms=None: None)
+        assert gemini.classify_texts([{"id": "t0", "text": "x"}], TOPICS, cancellation=CancellationToken(timeout_ms=1000)) == {}
+
+class TestEndpoints:
+    """Tests for deadline handling on the API"""
+
+    def test_classify_texts_with_deadline_completes(self):
+        response = client.post("/classify-texts", json={"texts": TEXTS, "topics": TOPICS, "timeout_ms": 60000})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["partial"] is False
+        assert len(data["results"]) == len(TEXTS)
+
+    def test_classify_texts_invalid_timeout(self):
+        response = client.post("/classify-texts", json={"texts": TEXTS, "topics": TOPICS, "timeout_ms": 0})
+        assert response.status_code == 422
+        response = client.post(
+            "/classify-texts", json={"texts": TEXTS, "topics": TOPICS}, headers={"X-Request-Timeout-Ms": "soon"}
+        )
+        assert response.status_code == 400
+
+def slow_encode(texts, model_name, pad_to_multiple_of=None):
+    time.sleep(0.1)
+    return torch.zeros(len(texts), 4)
+
+@pytest.fixture
+def slow_embeddings(monkeypatch):
+    """Micro-batches of 2 texts taking 100 ms each"""
+    monkeypatch.setattr(main, "encode_texts", slow_encode)
+    monkeypatch.setattr(main.admission_controller, "get_batch_sizer", lambda *args, **kwargs: MicroBatchSizer(min_size=2, max_size=2))
+
+class FakeRequest:
+    """Request whose client disconnects after `polls` disconnect checks"""
+    def __init__(self, polls: int):
+        self.polls = polls
+
+    async def is_disconnected(self) -> bool:
+        self.polls -= 1
+        return self.polls < 0
+
+class TestBatchEmbeddingDeadlines:
+    """Tests for dropping pending micro-batches on /batch-embeddings"""
+
+    def test_deadline_returns_partial(self, slow_embeddings):
+        texts = [f"text {i}" for i in range(10)]
+        response = client.post("/batch-embeddings", json={"texts": texts, "model_name": "m", "timeout_ms": 250})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["partial"] is True
+        assert 0 < len(data["embeddings"]) < len(texts)
+
+    def test_expired_before_first_batch_is_504(self, slow_embeddings, monkeypatch):
+        monkeypatch.setattr(main, "resolve_timeout_ms", lambda field, header: 0)
+        response = client.post("/batch-embeddings", json={"texts": ["a", "b"], "model_name": "m"})
+        assert response.status_code == 504
+
+    def test_disconnect_stops_pending_batches(self, slow_embeddings):
+        token = CancellationToken()
+        texts = [f"text {i}" for i in range(20)]
+        embeddings = asyncio.run(run_cancellable(
+            FakeRequest(polls=2), token, main.embed_in_micro_batches, texts, "m", token, EmbeddingOutputOptions()
+        ))
+        assert token.cancelled
+        assert 0 < len(embeddings) < len(texts)
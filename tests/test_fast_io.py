@@ -0,0 +1,108 @@
+import gzip
+import json
+import pytest
+import zstandard
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from fastapi.testclient import TestClient
+import main
+from main import BatchEmbeddingResponse, app
+from src.compaction import CompactedEmbedding
+from src.fast_io import CompressionMiddleware, negotiate_encoding
+
+client = TestClient(app)
+
+def compressed_app() -> TestClient:
+    compressed = FastAPI()
+    compressed.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @compressed.get("/large")
+    def large():
+        return ORJSONResponse({"values": [0.123456789] * 100})
+
+    @compressed.get("/small")
+    def small():
+        return ORJSONResponse({"ok": True})
+
+    @compressed.get("/binary")
+    def binary():
+        return PlainTextResponse("x" * 1000, media_type="application/octet-stream")
+
+    return TestClient(compressed)
+
+class TestNegotiation:
+    """Tests for Accept-Encoding negotiation"""
+
+    @pytest.mark.parametrize("header,expected", [
+        ("", None),
+        ("identity", None),
+        ("gzip, deflate, br", "gzip"),
+        ("gzip, zstd", "zstd"),
+        ("zstd;q=0.5, gzip", "gzip"),
+        ("gzip;q=0, zstd;q=0", None),
+        ("*", "zstd"),
+    ])
+    def test_negotiate(self, header, expected):
+        assert negotiate_encoding(header) == expected
+
+class TestCompressionMiddleware:
+    """Tests for compression of large responses"""
+
+    @pytest.mark.parametrize("encoding,decompress", [
+        ("gzip", gzip.decompress),
+        ("zstd", lambda body: zstandard.ZstdDecompressor().decompress(body)),
+    ])
+    def test_large_response_is_compressed(self, encoding, decompress):
+        with compressed_app().stream("GET", "/large", headers={"Accept-Encoding": encoding}) as response:
+            raw = b"".join(response.iter_raw())
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) == len(raw)
+        assert json.loads(decompress(raw)) == {"values": [0.123456789] * 100}
+
+    @pytest.mark.parametrize("path,accept", [("/large", "identity"), ("/small", "gzip"), ("/binary", "gzip")])
+    def test_not_compressed(self, path, accept):
+        response = compressed_app().get(path, headers={"Accept-Encoding": accept})
+        assert "content-encoding" not in response.headers
+
+class TestFastEndpoints:
+    """Tests that the fast path keeps the request and response schema"""
+
+    def test_batch_embeddings_schema(self, monkeypatch):
+        monkeypatch.setattr(main, "embed_in_micro_batches", lambda texts, *args: [CompactedEmbedding([0.5, -0.25] * 100, None) for _ in texts])
+        response = client.post("/batch-embeddings", json={"texts": ["a", "b"], "model_name": "m"}, headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"  # Decoded transparently by the client
+        body = response.json()
+        assert set(body) == set(BatchEmbeddingResponse.model_fields)
+        assert BatchEmbeddingResponse(**body).embeddings == [[0.5, -0.25] * 100] * 2
+
+    def test_invalid_body_is_422(self):
+        response = client.post("/batch-embeddings", content=b'{"texts": "not a list"}')
+        assert response.status_code == 422
+        locs = [tuple(e["loc"]) for e in response.json()["detail"]]
+        assert ("body", "texts") in locs and ("body", "model_name") in locs
+        assert client.post("/batch-embeddings", content=b"{").status_code == 422
+
+    @pytest.mark.parametrize("body,expected", [
+        (b"{", [{"type": "json_invalid", "loc": ["body", 1], "msg": "JSON decode error", "input": {},
+                 "ctx": {"error": "Expecting property name enclosed in double quotes"}}]),
+        (b"", [{"type": "missing", "loc": ["body"], "msg": "Field required", "input": None}]),
+        (b"[1]", [{"type": "model_attributes_type", "loc": ["body"],
+                   "msg": "Input should be a valid dictionary or object to extract fields from", "input": [1]}]),
+    ])
+    def test_422_matches_regular_body(self, body, expected):
+        response = client.post("/batch-embeddings", content=body, headers={"Content-Type": "application/json"})
+        assert response.status_code == 422
+        assert response.json()["detail"] == expected
+
+    def test_request_schema_documented(self):
+        openapi = client.get("/openapi.json").json()
+        body = openapi["paths"]["/classify-texts"]["post"]["requestBody"]
+        assert body["content"]["application/json"]["schema"] == {"$ref": "#/components/schemas/ClassifyTextsRequest"}
+        schemas = openapi["components"]["schemas"]
+        for name in ("EmbeddingRequest", "BatchEmbeddingRequest", "ClassifyTextsRequest", "TextItem", "TopicItem"):
+            assert name in schemas
+        assert schemas["ClassifyTextsRequest"]["required"] == ["texts", "topics"]
+        assert schemas["ClassifyTextsRequest"]["properties"]["texts"]["items"] == {"$ref": "#/components/schemas/TextItem"}
+        assert "default" not in schemas["ClassifyTextsRequest"]["properties"]["provider"]  # exclude_none, as FastAPI
@@ -0,0 +1,114 @@
+import json
+import os
+import pytest
+from transformers import BertConfig, BertModel, BertTokenizerFast
+from src.model_store import (
+    ModelStoreError,
+    add_artifact,
+    add_model,
+    export_artifact,
+    install_artifacts,
+    current_revision,
+    has_model,
+    model_dir,
+    load_from_store,
+    read_manifest,
+    verify,
+)
+
+MODEL_NAME = "test-org/tiny-bert"
+VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "hello", "world"]
+
+@pytest.fixture
+def tiny_model_dir(tmp_path):
+    """A tiny randomly initialised BERT saved with safetensors weights."""
+    source = tmp_path / "source"
+    source.mkdir()
+    vocab_file = tmp_path / "vocab.txt"
+    vocab_file.write_text("\n".join(VOCAB))
+    BertTokenizerFast(str(vocab_file)).save_pretrained(str(source))
+    config = BertConfig(vocab_size=len(VOCAB), hidden_size=8, num_hidden_layers=1, num_attention_heads=2, intermediate_size=16)
+    BertModel(config).save_pretrained(str(source))
+    return str(source)
+
+@pytest.fixture
+def store_dir(tmp_path):
+    return str(tmp_path / "store")
+
+class TestModelStore:
+    """Tests for the versioned local model store"""
+
+    def test_add_writes_manifest_and_current(self, tiny_model_dir, store_dir):
+        manifest = add_model(MODEL_NAME, tiny_model_dir, "rev1", store_dir)
+        assert has_model(MODEL_NAME, store_dir)
+        assert current_revision(MODEL_NAME, store_dir) == "rev1"
+        assert "model.safetensors" in manifest.files
+        assert all(f.size > 0 and len(f.sha256) == 64 for f in manifest.files.values())
+        assert read_manifest(MODEL_NAME, store_dir) == manifest
+
+    def test_new_revision_becomes_current(self, tiny_model_dir, store_dir):
+        add_model(MODEL_NAME, tiny_model_dir, "rev1", store_dir)
+        add_model(MODEL_NAME, tiny_model_dir, "rev2", store_dir)
+        assert current_revision(MODEL_NAME, store_dir) == "rev2"
+        assert verify(MODEL_NAME, store_dir).revision == "rev2"
+
+    def test_readding_revision_keeps_artifacts(self, tiny_model_dir, store_dir):
+        add_model(MODEL_NAME, tiny_model_dir, "rev1", store_dir)
+        revision_path = os.path.join(model_dir(MODEL_NAME, store_dir), "rev1")
+        with open(os.path.join(revision_path, "pca.safetensors"), "wb") as f:
+            f.write(b"projection")
+        add_artifact(MODEL_NAME, "pca.safetensors", store_dir)
+        manifest = add_model(MODEL_NAME, tiny_model_dir, "rev1", store_dir)  # e.g. fetch re-run on the pinned commit
+        assert "pca.safetensors" in manifest.files
+        assert open(os.path.join(revision_path, "pca.safetensors"), "rb").read() == b"projection"
+        verify(MODEL_NAME, store_dir)
+
+    def test_artifacts_export_and_install(self, tiny_model_dir, store_dir, tmp_path):
+        artifacts_dir = str(tmp_path / "artifacts")
+        add_model(MODEL_NAME, tiny_model_dir, "rev1", store_dir)
+        assert install_artifacts(MODEL_NAME, artifacts_dir, store_dir) == []
+        revision_path = os.path.join(model_dir(MODEL_NAME, store_dir), "rev1")
+        with open(os.path.join(revision_path, "pca.safetensors"), "wb") as f:
+            f.write(b"projection")
+        add_artifact(MODEL_NAME, "pca.safetensors", store_dir)
+        export_artifact(MODEL_NAME, "pca.safetensors", artifacts_dir, store_dir)
+        # A fresh store (as in the Docker build) gets the projection back from the artifacts directory
+        fresh_store = str(tmp_path / "fresh_store")
+        add_model(MODEL_NAME, tiny_model_dir, "rev1", fresh_store)
+        assert install_artifacts(MODEL_NAME, artifacts_dir, fresh_store) == ["pca.safetensors"]
+        assert "pca.safetensors" in verify(MODEL_NAME, fresh_store).files
+
+    def test_missing_model(self, store_dir):
+        assert not has_model(MODEL_NAME, store_dir)
+        with pytest.raises(ModelStoreError):
+            verify(MODEL_NAME, store_dir)
+
+    def test_requires_safetensors(self, tmp_path, store_dir):
+        source = tmp_path / "no_weights"
+        source.mkdir()
+        (source / "config.json").write_text(json.dumps({}))
+        with pytest.raises(ModelStoreError):
+            add_model(MODEL_NAME, str(source), "rev1", store_dir)
+        assert not has_model(MODEL_NAME, store_dir)
+
+    def test_verify_detects_tampering(self, tiny_model_dir, store_dir):
+        add_model(MODEL_NAME, tiny_model_dir, "rev1", store_dir)
+        path = os.path.join(store_dir, "test-org--tiny-bert", "rev1", "config.json")
+        with open(path, "r+b") as f:
+            data = f.read()
+            f.seek(0)
+            f.write(bytes([data[0] ^ 1]) + data[1:])
+        with pytest.raises(ModelStoreError, match="sha256"):
+            verify(MODEL_NAME, store_dir)
+        with open(path, "ab") as f:
+            f.write(b" ")
+        with pytest.raises(ModelStoreError, match="size"):
+            verify(MODEL_NAME, store_dir, check_hashes=False)
+
+    def test_load_offline(self, tiny_model_dir, store_dir, monkeypatch):
+        monkeypatch.setenv("HF_HUB_OFFLINE", "1")
+        add_model(MODEL_NAME, tiny_model_dir, "rev1", store_dir)
+        tokenizer, model = load_from_store(MODEL_NAME, store_dir)
+        outputs = model(**tokenizer("hello world", return_tensors="pt"))
+        assert outputs.last_hidden_state.shape[-1] == 8
+        assert not model.training